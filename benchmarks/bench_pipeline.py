@@ -0,0 +1,181 @@
+'''
+Time each stage of the ShapeScaler / BubbleScaler pipeline on the bundled maps.
+
+Every stage is timed on its own (best of ``--repeat`` runs), then run once more under
+tracemalloc to record its peak memory. Peak memory covers Python and NumPy allocations,
+not memory allocated inside GEOS.
+
+Usage::
+
+    python benchmarks/bench_pipeline.py                      # all maps and scalar distributions
+    python benchmarks/bench_pipeline.py --maps states county-06 --dists uniform
+    python benchmarks/bench_pipeline.py --compare benchmarks/results/A.json benchmarks/results/B.json
+
+Results are written to ``benchmarks/results/<timestamp>-<commit>.json``.
+'''
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import shapely
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import mapscaler as ms
+from mapscaler.maputils import alberize48_gdf
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+GEO = 'geometry'
+
+
+def lower_48(df, state_col):
+    #Drop Alaska, Hawaii and Puerto Rico
+    return df[~df[state_col].isin(['02', '15', '72'])].copy()
+
+MAPS = {
+    'states': lambda loader: lower_48(loader.fetch_states()['df'], 'STATE'),
+    'county-06': lambda loader: loader.fetch_counties('06')['df'],
+    'counties': lambda loader: lower_48(loader.fetch_counties()['df'], 'STATE_FIPS'),
+}
+
+
+def population_scalars(df, rng):
+    #Area scalars that give every shape the population density of a base shape at the 70th percentile,
+    #as in the "Creating Shape Scalars" tutorial
+    area = shapely.area(np.asarray(df[GEO].values))
+    population = df['EST_POP_2019'].to_numpy(dtype=float)
+    density = population / area
+    base = np.argsort(density)[int(.7*(len(df)-1))]
+    return np.sqrt(population*area[base] / (area*population[base]))
+
+DISTRIBUTIONS = {
+    'uniform': lambda df, rng: rng.uniform(.5, 1.5, len(df)),
+    'heavy-tailed': lambda df, rng: np.clip(rng.lognormal(-.2, .6, len(df)), .1, 5),
+    'population': population_scalars,
+}
+
+
+def measure(func, repeat):
+    #Best wall time of several runs, then one more run under tracemalloc for the peak memory
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, best, peak
+
+
+def find_groups(scaler, df, buffer):
+    scaler.index_by_row = scaler.index_geo_col(df, GEO)
+    scaler.overlapping_groups = scaler.get_overlapping_groups(df, GEO, buffer)
+    scaler.group_labels = scaler.index_overlapping_groups()
+    return scaler.overlapping_groups
+
+
+def update_centroids(scaler, df):
+    scaler.group_centroids = scaler.update_group_centroids(df, GEO)
+    return scaler.group_centroids
+
+
+def bench_case(map_name, dist_name, args):
+    records = []
+    def record(stage, func):
+        result, seconds, peak = measure(func, args.repeat)
+        records.append({'map': map_name, 'scalars': dist_name, 'stage': stage,
+                        'seconds': seconds, 'peak_bytes': peak})
+        print('{:<10} {:<13} {:<18} {:>10.4f}s {:>10.1f} MB'.format(map_name, dist_name, stage, seconds, peak/1e6))
+        return result
+
+    loader = ms.MapLoader()
+    MAPS[map_name](loader)  #Warm the on-disk cache so load times are comparable between runs
+    df = record('load', lambda: MAPS[map_name](loader))
+    df['scaleby'] = DISTRIBUTIONS[dist_name](df, np.random.default_rng(args.seed))
+
+    shapes = ms.ShapeScaler()
+    scaled = record('scale', lambda: shapes.scale_shapes(df, 'scaleby', GEO))
+    record('shape.groups', lambda: find_groups(shapes, scaled, args.buffer))
+    record('shape.centroids', lambda: update_centroids(shapes, scaled))
+    record('shape.nudge', lambda: shapes.nudge_shapes(scaled, GEO, args.map_vel, args.group_vel))
+    record('shape.separate', lambda: shapes.separate_map(scaled, GEO, args.map_vel, args.group_vel,
+                                                         args.buffer, args.max_iter, False))
+
+    bubbles = ms.BubbleScaler()
+    alberized = record('alberize', lambda: alberize48_gdf(scaled, GEO))
+    bubbled = record('bubble', lambda: bubbles.convert_to_bubbles(alberized, GEO))
+    record('bubble.groups', lambda: find_groups(bubbles, bubbled, args.buffer))
+    record('bubble.centroids', lambda: update_centroids(bubbles, bubbled))
+    record('bubble.nudge', lambda: bubbles.nudge_shapes(bubbled, GEO, args.map_vel, args.group_vel))
+    record('bubble.separate', lambda: bubbles.separate_map(bubbled, GEO, args.map_vel, args.group_vel,
+                                                           args.buffer, args.max_iter, False))
+    return records
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = dict(((r['map'], r['scalars'], r['stage']), r) for r in json.load(f)['results'])
+    with open(new_path) as f:
+        new = json.load(f)['results']
+    print('{:<10} {:<13} {:<18} {:>10} {:>10} {:>8} {:>8}'.format('map', 'scalars', 'stage', 'old s', 'new s',
+                                                                 'speedup', 'mem'))
+    for r in new:
+        key = (r['map'], r['scalars'], r['stage'])
+        if key in old:
+            o = old[key]
+            print('{:<10} {:<13} {:<18} {:>10.4f} {:>10.4f} {:>7.2f}x {:>7.2f}x'.format(
+                *key, o['seconds'], r['seconds'], o['seconds']/max(r['seconds'], 1e-12),
+                r['peak_bytes']/max(o['peak_bytes'], 1)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--maps', nargs='+', choices=list(MAPS), default=list(MAPS))
+    parser.add_argument('--dists', nargs='+', choices=list(DISTRIBUTIONS), default=list(DISTRIBUTIONS))
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per stage; the best is kept')
+    parser.add_argument('--max-iter', type=int, default=10, help='max_iter of the separate stages')
+    parser.add_argument('--map-vel', type=float, default=.01)
+    parser.add_argument('--group-vel', type=float, default=.1)
+    parser.add_argument('--buffer', type=float, default=0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='results file; default is benchmarks/results/<timestamp>-<commit>.json')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two results files and exit')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    records = []
+    for map_name in args.maps:
+        for dist_name in args.dists:
+            records.extend(bench_case(map_name, dist_name, args))
+
+    commit = git_commit()
+    stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+    output = args.output or os.path.join(RESULTS_DIR, '{}-{}.json'.format(stamp, commit))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({'commit': commit, 'timestamp': stamp, 'python': platform.python_version(),
+                   'machine': platform.platform(), 'settings': vars(args), 'results': records}, f, indent=1)
+    print('Results written to {}'.format(output))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,2 +1,4 @@
 from mapscaler.mapscaler import ShapeScaler, BubbleScaler
-from mapscaler.datasets import MapLoader
\ No newline at end of file
+from mapscaler.datasets import MapLoader
+from mapscaler.telemetry import IterationLog
+from mapscaler.template import MapTemplate
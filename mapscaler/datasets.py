@@ -1,51 +1,326 @@
 import geopandas as gpd
+import pandas as pd
+import numpy as np
+import shapely
+import hashlib
+import json
 import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+class MapCache():
+    """Process-level LRU cache of loaded maps, shared by every :class:`MapLoader`.
+
+    Maps are handed out as copies, so callers can modify them without changing the cached map.
+    The cache is disabled until it is given a size with :meth:`resize`.
+
+    :param max_maps: *Optional* - Maximum number of maps to keep. Default is ``0`` which disables the cache.
+    :type max_maps: int
+    :param max_bytes: *Optional* - Maximum estimated memory of all maps kept. Default is ``None`` for no limit.
+    :type max_bytes: int
+    """
+    def __init__(self, max_maps=0, max_bytes=None):
+        self.max_maps = max_maps
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.nbytes = 0
+        self._maps = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_maps > 0
+
+    def get(self, key):
+        '''
+        Return a copy of the map stored under **key**, or ``None`` if it isn't cached.
+        '''
+        with self._lock:
+            if key not in self._maps:
+                self.misses += 1
+                return None
+            self._maps.move_to_end(key)
+            self.hits += 1
+            gdf = self._maps[key][0]
+        return gdf.copy()
+
+    def put(self, key, gdf):
+        '''
+        Store **gdf** under **key**, evicting the least recently used maps to stay within budget.
+        The cache keeps **gdf** itself, so it should not be modified afterwards.
+        '''
+        nbytes = self.map_nbytes(gdf)
+        with self._lock:
+            if self.max_bytes is not None and nbytes > self.max_bytes:
+                return
+            if key in self._maps:
+                self.nbytes -= self._maps.pop(key)[1]
+            self._maps[key] = (gdf, nbytes)
+            self.nbytes += nbytes
+            self._evict()
+
+    def resize(self, max_maps, max_bytes=None):
+        '''
+        Change the budget of the cache, evicting maps if needed. A **max_maps** of ``0`` disables it.
+        '''
+        with self._lock:
+            self.max_maps = max_maps
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        '''
+        Remove every map from the cache and reset the counters.
+        '''
+        with self._lock:
+            self._maps.clear()
+            self.nbytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def info(self):
+        '''
+        Return the cache counters, to help size the cache.
+
+        :returns: ``dict`` of ``hits``, ``misses``, ``evictions``, number of ``maps``, their estimated ``nbytes``,
+            and the ``max_maps`` and ``max_bytes`` budget
+        :rtype: ``dict``
+        '''
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'maps': len(self._maps), 'nbytes': self.nbytes,
+                    'max_maps': self.max_maps, 'max_bytes': self.max_bytes}
+
+    def map_nbytes(self, gdf):
+        '''
+        Estimate the memory used by a map: its attribute columns plus 16 bytes per coordinate.
+        '''
+        geo = gdf.geometry.name
+        coords = shapely.get_num_coordinates(np.asarray(gdf[geo].values)).sum()
+        return int(gdf.drop(columns=geo).memory_usage(deep=True).sum() + 16*coords)
+
+    def _evict(self):
+        while self._maps and (len(self._maps) > self.max_maps or 
+                              (self.max_bytes is not None and self.nbytes > self.max_bytes)):
+            self.nbytes -= self._maps.popitem(last=False)[1][1]
+            self.evictions += 1
 
 class MapLoader():
     """Quickly load common maps of the US as GeoPandas Dataframes.
-    
-    .. note:: In most cases, the least detailed map options are used for performance. 
+
+    The first time a map is loaded, it is stored in an on-disk cache as WKB plus column
+    arrays, keyed by a hash of the source file. Later loads read from the cache,
+    and only the rows of the requested state.
+
+    :param use_cache: *Optional* - Whether to read and build the on-disk cache. Default is ``True``
+    :type use_cache: boolean
+    :param cache_dir: *Optional* - Directory of the on-disk cache. Default is the ``MAPSCALER_CACHE_DIR``
+        environment variable if set, else ``~/.cache/mapscaler``
+    :type cache_dir: str
+
+    Loaded maps can also be kept in memory for the life of the process, in the :class:`MapCache`
+    shared by all loaders at ``MapLoader.memory_cache``. It is off by default; turn it on with
+    ``MapLoader.memory_cache.resize(max_maps=16)``.
+
+    .. note:: In most cases, the least detailed map options are used for performance.
         All MapLoader methods return a ``sources`` item with links to find maps
-        with higher detail, if available.  
+        with higher detail, if available.
     """
-    def __init__(self):
+    #Source file hashes by (path, modified time, size), shared by all loaders in the process
+    _source_hashes = {}
+    #Loaded maps, shared by all loaders in the process
+    memory_cache = MapCache()
+
+    def __init__(self, use_cache=True, cache_dir=None):
         self.path = os.path.dirname(os.path.realpath(__file__))
         self.USCB_paths = {'population':
           'https://www2.census.gov/programs-surveys/popest/datasets/2010-2019/counties/totals/co-est2019-alldata.csv',
           'geography':
           'https://www.census.gov/geographies/mapping-files/time-series/geo/carto-boundary-file.html'
          }
-        
+        self.use_cache = use_cache
+        if cache_dir is None:
+            cache_dir = os.environ.get('MAPSCALER_CACHE_DIR',
+                                       os.path.join(os.path.expanduser('~'), '.cache', 'mapscaler'))
+        self.cache_dir = cache_dir
+
     def fetch_counties(self, state_fips=None):
         '''
         Load a map of the US counties.
-        
+
         :param state_fips: *Optional* - State FIPS code as a string. Default is ``None`` which loads all states.
         :type state_fips: str
-        :returns: ``dict`` with 2 keys: 
-        
+        :returns: ``dict`` with 2 keys:
+
             **df** is a `GeoPandas DataFrame <https://geopandas.org/reference/geopandas.GeoDataFrame.html>`_,\
-                including a column of shape objects. 
-                
+                including a column of shape objects.
+
             **sources** is a dict of links to the original map source.
         :rtype: ``dict``
         '''
-        gdf = gpd.read_file(os.path.join(self.path,'geojson','us_counties.json'))
-        if state_fips:
-            gdf = gdf[gdf.STATE_FIPS==str(state_fips)].copy()
+        state = str(state_fips) if state_fips else None
+        gdf = self.read_map('us_counties.json', 'STATE_FIPS', state)
         return {'df':gdf, 'sources':self.USCB_paths}
-    
+
     def fetch_states(self):
         '''
         Load a map of the US states, including Puerto Rico.
-        
-        :returns: ``dict`` with 2 keys: 
-        
+
+        :returns: ``dict`` with 2 keys:
+
             **df** is a `GeoPandas DataFrame <https://geopandas.org/reference/geopandas.GeoDataFrame.html>`_,\
-                including a column of shape objects. 
-                
+                including a column of shape objects.
+
             **sources** is a dict of links to the original map source.
         :rtype: ``dict``
         '''
-        gdf = gpd.read_file(os.path.join(self.path, 'geojson','us_states.json'))
+        gdf = self.read_map('us_states.json')
         return {'df':gdf, 'sources':self.USCB_paths}
+
+    def read_map(self, filename, group_col=None, group=None):
+        '''
+        Load one of the bundled maps, through the in-memory and on-disk caches if enabled.
+
+        :param filename: Name of the map file in the ``geojson`` folder
+        :type filename: str
+        :param group_col: *Optional* - Name of a column to index the cache by, so that
+            rows with a single value can be read alone
+        :type group_col: str
+        :param group: *Optional* - Value of **group_col** to load. Default is ``None`` which loads all rows.
+        :type group: str
+        :returns: The map, with the same rows, index and columns as reading **filename** directly
+        :rtype: GeoPandas ``DataFrame``
+        '''
+        source = os.path.join(self.path, 'geojson', filename)
+        memory_cache = MapLoader.memory_cache
+        if not memory_cache.enabled:
+            return self._load_map(source, group_col, group)
+        stat = os.stat(source)
+        key = (source, stat.st_mtime_ns, stat.st_size, group_col, group)
+        gdf = memory_cache.get(key)
+        if gdf is None:
+            gdf = self._load_map(source, group_col, group)
+            memory_cache.put(key, gdf)
+            gdf = gdf.copy()
+        return gdf
+
+    def _load_map(self, source, group_col, group):
+        if self.use_cache:
+            try:
+                cache_path = self._get_cache_path(source, group_col)
+                if not os.path.isdir(cache_path):
+                    self._build_cache(source, cache_path, group_col)
+                return self._read_cache(cache_path, group)
+            except OSError:
+                #Cache directory isn't writable or readable; read the source directly
+                pass
+        gdf = gpd.read_file(source)
+        if group is not None:
+            gdf = gdf[gdf[group_col]==group].copy()
+        return gdf
+
+    def clear_cache(self):
+        '''
+        Delete every map stored in the on-disk cache.
+        '''
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def _get_cache_path(self, source, group_col=None):
+        stat = os.stat(source)
+        key = (source, stat.st_mtime_ns, stat.st_size)
+        if key not in MapLoader._source_hashes:
+            with open(source, 'rb') as f:
+                MapLoader._source_hashes[key] = hashlib.sha256(f.read()).hexdigest()[:16]
+        name = os.path.splitext(os.path.basename(source))[0]
+        if group_col is not None:
+            name = '{}-by-{}'.format(name, group_col)
+        return os.path.join(self.cache_dir, '{}-{}'.format(name, MapLoader._source_hashes[key]))
+
+    def _build_cache(self, source, cache_path, group_col):
+        gdf = gpd.read_file(source)
+        geo = gdf.geometry.name
+        #Sort rows so that each group is one contiguous block, keeping file order within groups
+        rows = np.arange(len(gdf))
+        if group_col is not None:
+            rows = np.lexsort((rows, gdf[group_col].to_numpy(dtype=str)))
+        gdf = gdf.iloc[rows]
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = tempfile.mkdtemp(dir=self.cache_dir)
+        try:
+            wkbs = shapely.to_wkb(np.asarray(gdf[geo].values))
+            offsets = np.zeros(len(wkbs)+1, dtype=np.int64)
+            np.cumsum([len(wkb) for wkb in wkbs], out=offsets[1:])
+            np.save(os.path.join(tmp_path, 'wkb.npy'), np.frombuffer(b''.join(wkbs), dtype=np.uint8))
+            np.save(os.path.join(tmp_path, 'offsets.npy'), offsets)
+            np.save(os.path.join(tmp_path, 'rows.npy'), rows)
+
+            columns = []
+            for i, col in enumerate(gdf.columns):
+                if col == geo:
+                    columns.append({'name': col, 'geometry': True})
+                    continue
+                values = gdf[col]
+                nulls = values.isna().to_numpy()
+                if pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+                    array = values.to_numpy()
+                else:
+                    array = values.where(~nulls, '').to_numpy(dtype=str)
+                np.save(os.path.join(tmp_path, 'col{}.npy'.format(i)), array)
+                #Strings can't hold nulls, so those are stored as a separate mask
+                string_nulls = bool(nulls.any() and array.dtype.kind == 'U')
+                if string_nulls:
+                    np.save(os.path.join(tmp_path, 'col{}_nulls.npy'.format(i)), nulls)
+                columns.append({'name': col, 'file': 'col{}'.format(i), 'dtype': str(values.dtype),
+                                'nulls': string_nulls})
+
+            groups = {}
+            if group_col is not None:
+                keys, starts = np.unique(gdf[group_col].to_numpy(dtype=str), return_index=True)
+                stops = np.append(starts[1:], len(gdf))
+                groups = dict((key, [int(start), int(stop)]) for key, start, stop in zip(keys, starts, stops))
+            meta = {'columns': columns,
+                    'crs': gdf.crs.to_json() if gdf.crs is not None else None,
+                    'groups': groups}
+            with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+                json.dump(meta, f)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            #Another process may have built the same cache first
+            if not os.path.isdir(cache_path):
+                raise
+
+    def _read_cache(self, cache_path, group=None):
+        with open(os.path.join(cache_path, 'meta.json')) as f:
+            meta = json.load(f)
+        def load(name):
+            return np.load(os.path.join(cache_path, name+'.npy'), mmap_mode='r')
+
+        start, stop = 0, len(load('rows'))
+        if group is not None:
+            start, stop = meta['groups'].get(group, [0, 0])
+        rows = np.array(load('rows')[start:stop])
+        #Restore file order
+        order = np.argsort(rows, kind='stable')
+
+        offsets = np.array(load('offsets')[start:stop+1])
+        blob = load('wkb')[offsets[0]:offsets[-1]].tobytes()
+        offsets -= offsets[0]
+        wkbs = np.array([blob[a:b] for a, b in zip(offsets[:-1], offsets[1:])], dtype=object)
+
+        data = {}
+        for column in meta['columns']:
+            if column.get('geometry'):
+                geo = column['name']
+                data[geo] = shapely.from_wkb(wkbs)[order]
+                continue
+            values = pd.Series(np.array(load(column['file'])[start:stop])[order]).astype(column['dtype'])
+            if column['nulls']:
+                values[np.array(load(column['file']+'_nulls')[start:stop])[order]] = None
+            data[column['name']] = values.array
+        index = pd.RangeIndex(len(rows)) if group is None else pd.Index(rows[order])
+        return gpd.GeoDataFrame(data, geometry=geo, crs=meta['crs'], index=index)
@@ -0,0 +1,352 @@
+import numpy as np
+import shapely
+from shapely.strtree import STRtree
+
+
+class PolygonLayout():
+    '''
+    Array-native working state of a map while it is being separated.
+
+    Shapes are only ever translated during separation, so the layout keeps the original
+    geometries, their packed coordinates and a per-shape offset. Geometries are rebuilt
+    only for shapes that move.
+
+    Overlap detection is incremental: the spatial index and the overlapping pairs found
+    so far are kept between calls, and only shapes that moved since are re-queried.
+
+    With a **tolerance**, the layout separates simplified proxies of the shapes and only moves
+    the full-detail shapes in :meth:`geometries`. Each proxy contains its shape and reaches at most
+    about twice **tolerance** beyond it, so shapes are at least as far apart as their proxies.
+
+    :param geoms: Array of Shapely objects (Polygon or MultiPolygon)
+    :type geoms: numpy.ndarray
+    :param tolerance: *Optional* - Tolerance to simplify shapes by, preserving topology; default is ``0``
+    :type tolerance: float
+    '''
+    def __init__(self, geoms, tolerance=0):
+        geoms = np.array(geoms, dtype=object)
+        is_poly = np.isin(shapely.get_type_id(geoms), [shapely.GeometryType.POLYGON, shapely.GeometryType.MULTIPOLYGON])
+        if not is_poly.all():
+            raise ValueError('Geometry values must be Shapely objects, not {}'.format( type(geoms[~is_poly][0]) ) )
+        self.detail = geoms
+        self.tolerance = tolerance
+        if tolerance:
+            #Simplifying leaves every vertex of the shape within the tolerance of the simplified outline,
+            #so an outline the tolerance around that contains the shape
+            proxies = shapely.buffer(shapely.simplify(geoms, tolerance, preserve_topology=True), tolerance, quad_segs=2)
+            #Except where its corners, cut short by the few segments, come closer than the tolerance;
+            #simplify those shapes by half as much
+            uncovered = np.flatnonzero(~shapely.covers(proxies, geoms))
+            proxies[uncovered] = shapely.buffer(shapely.simplify(geoms[uncovered], tolerance/2, preserve_topology=True), 
+                                                tolerance, quad_segs=2)
+            geoms = proxies
+        self.original = geoms
+        self.geoms = geoms.copy()
+        self.offsets = np.zeros((len(geoms), 2))
+        self.areas = shapely.area(geoms)
+        #Centroid of every original shape, and the area-weighted sum of the current centroids
+        self._centroids = shapely.get_coordinates(shapely.centroid(geoms))
+        self._moments = self.areas @ self._centroids
+        self._coords = None
+        self._coord_index = None
+        #Overlapping pairs as of the last query, and the buffer they were found with
+        self._pairs = None
+        self._pairs_buffer = None
+        #Buffered shapes as of the last query, and the buffer of every original shape with its packed coordinates
+        self._buffered = None
+        self._outlines = None
+        #Shapes moved since the last query
+        self._dirty = np.ones(len(geoms), dtype=bool)
+        #Extent of every original shape along each sampled direction, for translation vectors
+        self._extents = None
+        #Spatial index, and which of its entries still match the current shapes
+        self._tree = None
+        self._tree_current = np.zeros(len(geoms), dtype=bool)
+        #Shapes that translate() leaves where they are
+        self.fixed = np.zeros(len(geoms), dtype=bool)
+
+    def __len__(self):
+        return len(self.geoms)
+
+    def pack(self):
+        '''
+        Returns every coordinate of the original shapes as one array, with the row of the shape each belongs to.
+        '''
+        if self._coords is None:
+            self._coords, self._coord_index = shapely.get_coordinates(self.original, return_index=True)
+        return self._coords, self._coord_index
+
+    def overlap_pairs(self, buffer):
+        '''
+        Returns two arrays of rows, ``(left, right)``, for every pair of shapes
+        within **buffer** of each other. Every shape is paired with itself.
+        '''
+        dirty = np.flatnonzero(self._dirty)
+        if buffer != self._pairs_buffer:
+            self._pairs = None
+            self._buffered = self._buffer(buffer, np.ones(len(self), dtype=bool))
+        elif len(dirty) and buffer:
+            self._buffered[dirty] = self._buffer(buffer, self._dirty)[dirty]
+        if self._pairs is None or len(dirty) > len(self)*0.9:
+            #Nearly every shape moved; query everything against a fresh index
+            self._tree = STRtree(self.geoms)
+            self._tree_current[:] = True
+            self._pairs = self._tree.query(self._buffered, predicate='intersects')
+        elif len(dirty):
+            left, right = self._pairs
+            #Pairs between shapes that didn't move still hold
+            keep = ~self._dirty[left] & ~self._dirty[right]
+            new_left, new_right = self._query_moved(dirty, buffer)
+            self._pairs = (np.concatenate([left[keep], new_left, dirty]),
+                           np.concatenate([right[keep], new_right, dirty]))
+        self._pairs_buffer = buffer
+        self._dirty[:] = False
+        return self._pairs
+
+    def _buffer(self, buffer, rows):
+        #Shapes are only ever translated, so buffer the original shapes once and move their outlines along
+        if not buffer:
+            return self.geoms
+        if self._outlines is None or self._outlines[0] != buffer:
+            outlines = shapely.buffer(self.original, buffer)
+            self._outlines = (buffer, outlines, shapely.get_coordinates(outlines, return_index=True))
+        _, outlines, packed = self._outlines
+        buffered = outlines.copy()
+        buffered[rows] = self._translated(outlines, packed, rows)
+        return buffered
+
+    def _query_moved(self, dirty, buffer):
+        #Rebuild the index once most of its entries are out of date
+        stale = np.flatnonzero(~self._tree_current)
+        if len(stale) > len(self)/4:
+            self._tree = STRtree(self.geoms)
+            self._tree_current[:] = True
+            stale = stale[:0]
+        #Candidates from the index where its entries are current, and from a small index of the rest
+        query_geoms = self._buffered[dirty]
+        shapely.prepare(query_geoms)
+        query_rows, tree_rows = self._tree.query(query_geoms)
+        current = self._tree_current[tree_rows]
+        query_rows, tree_rows = query_rows[current], tree_rows[current]
+        if len(stale):
+            stale_query_rows, stale_tree_rows = STRtree(self.geoms[stale]).query(query_geoms)
+            query_rows = np.concatenate([query_rows, stale_query_rows])
+            tree_rows = np.concatenate([tree_rows, stale[stale_tree_rows]])
+        moved_rows = dirty[query_rows]
+        not_self = moved_rows != tree_rows
+        moved_rows, tree_rows, query_rows = moved_rows[not_self], tree_rows[not_self], query_rows[not_self]
+        #Test both directions, as a full query would
+        overlapping = shapely.intersects(query_geoms[query_rows], self.geoms[tree_rows])
+        if buffer:
+            overlapping |= shapely.intersects(self._buffered[tree_rows], self.geoms[moved_rows])
+        return moved_rows[overlapping], tree_rows[overlapping]
+
+    def overlap_area(self, buffer):
+        '''
+        Returns the total area where shapes overlap each other, counting each overlapping pair once.
+        '''
+        left, right = self._distinct_pairs(buffer)
+        return float(shapely.area(shapely.intersection(self.geoms[left], self.geoms[right])).sum())
+
+    def overlap_depths(self, buffer):
+        '''
+        Returns four arrays, ``(left, right, area, depth)``, for every pair of distinct shapes within 
+        **buffer** of each other: the area where they overlap, and roughly how far apart they must move 
+        to be **buffer** apart, taken from the narrow side of the bounding box of their overlap.
+        '''
+        left, right = self._distinct_pairs(buffer)
+        overlaps = shapely.intersection(self.geoms[left], self.geoms[right])
+        minx, miny, maxx, maxy = shapely.bounds(overlaps).T
+        depth = np.minimum(maxx - minx, maxy - miny)
+        #Pairs that only come within the buffer are short by the buffer less the gap between them
+        apart = np.isnan(depth)
+        depth[apart] = -shapely.distance(self.geoms[left[apart]], self.geoms[right[apart]])
+        return left, right, shapely.area(overlaps), depth + buffer
+
+    def _distinct_pairs(self, buffer):
+        #Pairs found incrementally are only listed one way round, so order each pair before dropping repeats
+        left, right = self.overlap_pairs(buffer)
+        low, high = np.minimum(left, right), np.maximum(left, right)
+        distinct = np.unique((low * len(self) + high)[low != high])
+        return distinct // len(self), distinct % len(self)
+
+    def translation_vectors(self, buffer, directions=32):
+        '''
+        Returns four arrays, ``(left, right, units, distances)``, for every pair of distinct shapes within 
+        **buffer** of each other, where each row of the (n, 2) **units** array times the matching distance is 
+        the shortest move of the left shape that leaves it **buffer** away from the right one.
+        
+        Shapes are compared by their extents along **directions** evenly spaced directions, as in the 
+        separating axis test, so vectors are exact for convex shapes whose edges lie along those directions 
+        and otherwise tend to overshoot.
+        '''
+        left, right = self._distinct_pairs(buffer)
+        units = np.column_stack([np.cos(np.pi*np.arange(directions)/directions), 
+                                 np.sin(np.pi*np.arange(directions)/directions)])
+        if self._extents is None or len(self._extents[0]) != directions:
+            coords, coord_index = self.pack()
+            projected = coords @ units.T
+            low = np.full((len(self), directions), np.inf)
+            high = np.full((len(self), directions), -np.inf)
+            np.minimum.at(low, coord_index, projected)
+            np.maximum.at(high, coord_index, projected)
+            self._extents = (units, low, high)
+        _, low, high = self._extents
+        shift = self.offsets @ units.T
+        low, high = low + shift, high + shift
+        #How far the left shape must move along or against each direction to clear the right one
+        forward = high[right] - low[left] + buffer
+        backward = high[left] - low[right] + buffer
+        distance = np.minimum(forward, backward)
+        best = np.argmin(distance, axis=1)
+        pairs = np.arange(len(left))
+        sign = np.where(forward[pairs, best] < backward[pairs, best], 1, -1)
+        return left, right, units[best] * sign[:, np.newaxis], distance[pairs, best]
+
+    def centroids(self):
+        '''
+        Returns the [x,y] centroid of every shape as an (n, 2) array.
+        '''
+        return self._centroids + self.offsets
+
+    def group_centroids(self, groups):
+        '''
+        Returns the [x,y] centroid of every group of shapes taken together, as an array indexed by group number.
+
+        The centroid of several shapes is the area-weighted mean of their centroids, the same as the
+        centroid of a MultiPolygon of all their parts.
+
+        :param groups: Group number of every shape
+        :type groups: numpy.ndarray
+        '''
+        centroids = self.centroids()
+        weights = np.bincount(groups, self.areas)
+        moments = np.column_stack([np.bincount(groups, self.areas * centroids[:, 0], minlength=len(weights)),
+                                   np.bincount(groups, self.areas * centroids[:, 1], minlength=len(weights))])
+        return np.divide(moments, weights[:, np.newaxis], out=np.zeros_like(moments), where=weights[:, np.newaxis] > 0)
+
+    def map_centroid(self):
+        '''
+        Returns the [x,y] centroid of all shapes taken together.
+        '''
+        return self._moments / self.areas.sum()
+
+    def translate(self, movement):
+        '''
+        Move every shape by its row of the (n, 2) **movement** array, except any ``fixed`` shapes.
+        '''
+        movement = self._unfixed(movement)
+        self.offsets += movement
+        moved = movement.any(axis=1)
+        self._moments += self.areas[moved] @ movement[moved]
+        self._rebuild(moved)
+        self._dirty |= moved
+        self._tree_current &= ~moved
+
+    def _unfixed(self, movement):
+        #Movement with the fixed shapes held in place
+        if self.fixed.any():
+            return np.where(self.fixed[:, np.newaxis], 0., movement)
+        return movement
+
+    def _rebuild(self, rows):
+        #Rebuild shapes from their original coordinates plus total offset
+        self.geoms[rows] = self._translated(self.original, self.pack(), rows)
+
+    def _translated(self, shapes, packed, rows):
+        #Shapes in rows moved by their total offset, from their packed original coordinates
+        coords, coord_index = packed
+        row_coords = rows[coord_index]
+        return shapely.set_coordinates(shapes[rows].copy(), coords[row_coords] + self.offsets[coord_index[row_coords]])
+
+    def geometries(self):
+        '''
+        Returns the array of shapes at their current positions, in full detail.
+        '''
+        if self.detail is self.original:
+            return self.geoms
+        coords, coord_index = shapely.get_coordinates(self.detail, return_index=True)
+        return shapely.set_coordinates(self.detail.copy(), coords + self.offsets[coord_index])
+
+    def proxies(self):
+        '''
+        Returns the array of shapes being separated at their current positions, simplified if the layout has a tolerance.
+        '''
+        return self.geoms
+
+
+class CircleLayout(PolygonLayout):
+    '''
+    Working state of a map of bubbles, separated analytically as (x, y, r) arrays.
+
+    Each shape is represented by the smallest circle around its centroid containing it, so
+    for the output of :meth:`BubbleScaler.convert_to_bubbles` the circles are exact. Shapes are
+    only rebuilt when :meth:`geometries` is called.
+
+    Circles have no vertices to simplify, so **tolerance** is ignored.
+
+    :param geoms: Array of Shapely objects (Polygon or MultiPolygon)
+    :type geoms: numpy.ndarray
+    '''
+    def __init__(self, geoms, tolerance=0):
+        super().__init__(geoms)
+        self.centers = shapely.get_coordinates(shapely.centroid(self.original))
+        coords, coord_index = self.pack()
+        self.radii = np.zeros(len(self.original))
+        np.maximum.at(self.radii, coord_index, np.hypot(*(coords - self.centers[coord_index]).T))
+        self._moved = np.zeros(len(self.original), dtype=bool)
+
+    def overlap_pairs(self, buffer):
+        #Candidate pairs have overlapping bounding boxes
+        x, y = self.centers.T
+        reach = self.radii + buffer
+        tree = STRtree(shapely.box(x - self.radii, y - self.radii, x + self.radii, y + self.radii))
+        left, right = tree.query(shapely.box(x - reach, y - reach, x + reach, y + reach))
+        #Circles overlap when their centers are closer than the sum of their radii
+        gaps = np.hypot(*(self.centers[left] - self.centers[right]).T) - self.radii[left] - self.radii[right]
+        overlapping = gaps <= buffer
+        return left[overlapping], right[overlapping]
+
+    def overlap_area(self, buffer):
+        return float(self.overlap_depths(buffer)[2].sum())
+
+    def overlap_depths(self, buffer):
+        left, right = self._distinct_pairs(buffer)
+        r1, r2 = self.radii[left], self.radii[right]
+        d = np.hypot(*(self.centers[left] - self.centers[right]).T)
+        #Area of the lens where two circles overlap; the smaller circle if one holds the other
+        with np.errstate(divide='ignore', invalid='ignore'):
+            lens = (r1**2 * np.arccos(np.clip((d**2 + r1**2 - r2**2) / (2*d*r1), -1, 1))
+                    + r2**2 * np.arccos(np.clip((d**2 + r2**2 - r1**2) / (2*d*r2), -1, 1))
+                    - .5 * np.sqrt(np.clip((-d + r1 + r2) * (d + r1 - r2) * (d - r1 + r2) * (d + r1 + r2), 0, None)))
+        lens = np.where(d <= np.abs(r1 - r2), np.pi * np.minimum(r1, r2)**2, lens)
+        lens = np.where(d >= r1 + r2, 0, lens)
+        return left, right, lens, r1 + r2 + buffer - d
+
+    def translation_vectors(self, buffer, directions=32):
+        #Circles separate fastest straight along the line between their centers
+        left, right = self._distinct_pairs(buffer)
+        away = self.centers[left] - self.centers[right]
+        d = np.hypot(*away.T)
+        units = np.divide(away, d[:, np.newaxis], out=np.tile([1., 0.], (len(d), 1)), where=d[:, np.newaxis] > 0)
+        return left, right, units, self.radii[left] + self.radii[right] + buffer - d
+
+    def centroids(self):
+        return self.centers.copy()
+
+    def translate(self, movement):
+        movement = self._unfixed(movement)
+        self.offsets += movement
+        self.centers += movement
+        moved = movement.any(axis=1)
+        self._moments += self.areas[moved] @ movement[moved]
+        self._moved |= moved
+
+    def geometries(self):
+        if self._moved.any():
+            self._rebuild(self._moved)
+            self._moved[:] = False
+        return self.geoms
+
+    def proxies(self):
+        return self.geometries()
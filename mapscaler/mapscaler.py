@@ -1,17 +1,30 @@
+import time
+import inspect
+import asyncio
+import hashlib
+import threading
 import numpy as np
+import pandas as pd
 import geopandas as gpd
-from shapely.geometry import Polygon, MultiPolygon, Point
-from shapely.ops import unary_union
-from shapely.strtree import STRtree
-from shapely.affinity import scale
-from mapscaler.maputils import alberize48_gdf
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import shapely
+from shapely.geometry import Polygon, MultiPolygon
+from shapely.affinity import translate
+from mapscaler.maputils import alberize48_gdf, connected_components
+from mapscaler.layouts import PolygonLayout, CircleLayout
 
 class BaseScaler():
+    #Runs of scale_map_async in progress, by event loop and map, shared by concurrent identical requests
+    _async_runs = {}
+    
     def __init__(self):
         self.overlapping_groups = {}
-        self.overlapping_groups_index = {}
-        self.index_by_id = {}
+        self.group_labels = np.zeros(0, dtype=int)
+        self.index_by_row = np.zeros(0)
         self.group_centroids = {}     
+        self.convergence_report = {}
+        self.convergence_reports = {}
+        self.displacements = np.zeros((0, 2))
         
     def scale_shapes(self, df, scaleby, geo):
         '''
@@ -23,19 +36,219 @@ class BaseScaler():
         :type scaleby: str        
         :param geo: string name of the geometry column in **df**
         :type geo: str        
+        :raises ValueError: if any scalar is missing, not a number, infinite, zero or negative
         
         
         .. warning:: This function scales by coordinates. Scaling coordinates by :math:`x` will
             scale the area of the shape by :math:`x^2`. More info: :ref:`scalars`
         '''
-        newShapes = []
-        for shape, scaleby in zip(df[geo], df[scaleby]):
-            poly = scale(shape, xfact=scaleby,yfact=scaleby,origin='center')
-            newShapes.append(poly)
+        factors = self._get_scalars(df, scaleby)
         newdf = df.copy()
-        newdf[geo] = newShapes
+        newdf[geo] = self._scale_packed(self._pack_shapes(df, geo), factors)
         newdf[geo] = newdf[geo].astype('geometry')
         return newdf       
+    
+    def _get_scalars(self, df, scaleby):
+        return self._check_scalars(df[scaleby], df.index, 'in column {}'.format(scaleby))
+    
+    def _check_scalars(self, scalars, index, source):
+        #Anything that isn't a number becomes NaN, to be reported with the rest
+        factors = np.asarray(pd.to_numeric(scalars, errors='coerce'), dtype=float)
+        invalid = ~(np.isfinite(factors) & (factors > 0))
+        if invalid.any():
+            raise ValueError('Scalars {} must be finite positive numbers; {} rows are not, including index {}'.format(
+                source, invalid.sum(), list(index[invalid][:5]) ) )
+        return factors
+    
+    def _scale_map_options(self, kwargs, exclude=()):
+        #Other arguments of scale_map with its defaults filled in, rejecting any arguments it doesn't take
+        options = inspect.signature(self.scale_map).bind(None, None, **kwargs)
+        options.apply_defaults()
+        return dict((name, value) for name, value in options.arguments.items() 
+                    if name not in ('df', 'scaleby') + tuple(exclude))
+    
+    def _pack_shapes(self, df, geo):
+        #Shapes, the center of their bounding boxes and their packed coordinates, which don't depend on the scalars
+        shapes = np.asarray(df[geo].values)
+        minx, miny, maxx, maxy = shapely.bounds(shapes).T
+        centers = np.column_stack([(minx + maxx)/2, (miny + maxy)/2])
+        coords, coord_index = shapely.get_coordinates(shapes, return_index=True)
+        return shapes, centers, coords, coord_index
+    
+    def _scale_packed(self, packed, factors):
+        #Scale every shape about the center of its bounding box, all in one array operation
+        shapes, centers, coords, coord_index = packed
+        coords = centers[coord_index] + (coords - centers[coord_index]) * factors[coord_index, np.newaxis]
+        return shapely.set_coordinates(shapes.copy(), coords)
+    
+    def scale_maps(self, df, columns, geo='geometry', n_jobs=1, warm_start=False, **kwargs):
+        '''
+        Scale one map by each of several columns of scalars, as :meth:`scale_map` would one at a time.
+        
+        The shapes are parsed and their coordinates extracted once, and only scaled and separated 
+        for each column.
+        
+        :param df: GeoPandas Dataframe 
+        :type df: GeoPandas DataFrame
+        :param columns: string names of the columns in **df** with scalar values
+        :type columns: list
+        :param geo: *Optional* - string name of the geometry column in **df**; default is ``'geometry'``
+        :type geo: str
+        :param n_jobs: *Optional* - Number of processes to scale columns in, each separating its map in one 
+            process; default is ``1``
+        :type n_jobs: int
+        :param warm_start: *Optional* - Whether to start separating each column from where shapes ended up for the 
+            one before it, as with **initial_displacements** in :meth:`separate_map`. Usually much faster when the 
+            columns are similar, such as one per year, and keeps shapes from jumping around between them. Columns are
+            then scaled one after the other, so it can't be combined with **n_jobs**; default is ``False``
+        :type warm_start: boolean
+        :param kwargs: *Optional* - Any other arguments of :meth:`scale_map`, used for every column
+        :raises ValueError: if any column's scalars are invalid, or if a **callback** or **warm_start** are combined 
+            with **n_jobs** above 1
+        :returns: key, value pairs where key is a column name and value is the dataframe scaled by it. 
+            The ``convergence_report`` of each column is kept in ``convergence_reports``
+        :rtype: ``dict``
+        '''
+        options = self._scale_map_options(kwargs, exclude=['geo'])
+        if n_jobs > 1 and options['callback'] is not None:
+            raise ValueError('Callbacks are called in the process that separates the map; use n_jobs=1')
+        if n_jobs > 1 and warm_start:
+            raise ValueError('Warm started columns are scaled one after the other; use n_jobs=1')
+        factors = dict((column, self._get_scalars(df, column)) for column in columns)
+        packed = self._pack_shapes(df, geo)
+        
+        def scaled(column):
+            scaled_df = df.copy()
+            scaled_df[geo] = self._scale_packed(packed, factors[column])
+            scaled_df[geo] = scaled_df[geo].astype('geometry')
+            return scaled_df
+        
+        results = {}
+        self.convergence_reports = {}
+        if n_jobs > 1:
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                futures = dict((column, executor.submit(_scale_column, type(self), scaled(column), geo, options))
+                               for column in columns)
+                for column, future in futures.items():
+                    results[column], self.convergence_reports[column] = future.result()
+        else:
+            for column in columns:
+                results[column] = self._separate_scaled(scaled(column), geo, **options)
+                self.convergence_reports[column] = self.convergence_report
+                if warm_start:
+                    options['initial_displacements'] = self.displacements
+        return results
+    
+    def scale_template(self, template, scalars, **kwargs):
+        '''
+        Scale a map prepared as a :class:`MapTemplate` by any scalars, as :meth:`scale_map` would its dataframe.
+        
+        The shapes are rebuilt from the template's packed coordinates, so nothing is parsed again.
+        
+        :param template: Map to scale
+        :type template: MapTemplate
+        :param scalars: Scalar of every shape, in the order of the template, or a Series indexed like the 
+            dataframe the template was made from
+        :type scalars: numpy.ndarray or pandas.Series
+        :param kwargs: *Optional* - Any other arguments of :meth:`scale_map`, except **geo**
+        :raises ValueError: if any scalar is missing, not a number, infinite, zero or negative
+        :returns: Dataframe with the template's index and a geometry column alone
+        :rtype: GeoPandas ``DataFrame``
+        '''
+        options = self._scale_map_options(kwargs, exclude=['geo'])
+        if isinstance(scalars, pd.Series):
+            scalars = scalars.reindex(template.index)
+        factors = self._check_scalars(scalars, template.index, 'for the template')
+        packed = (template.shapes(), template.centers, template.coords, template.coord_index)
+        scaled_df = template.frame()
+        scaled_df[template.geo] = self._scale_packed(packed, factors)
+        scaled_df[template.geo] = scaled_df[template.geo].astype('geometry')
+        return self._separate_scaled(scaled_df, template.geo, **options)
+    
+    async def scale_map_async(self, df, scaleby, progress=None, time_budget=None, executor=None, **kwargs):
+        '''
+        Coroutine that runs :meth:`scale_map` off the event loop, for async services.
+        
+        The map is scaled in **executor**, reporting progress to the event loop after every iteration.
+        Cancelling the coroutine stops the separation after the iteration in progress. Concurrent calls 
+        for the same map, scalars and arguments, without their own **callback** or **initial_displacements**, 
+        share one run, which only stops once all of them are cancelled.
+        
+        :param df: GeoPandas Dataframe 
+        :type df: GeoPandas DataFrame
+        :param scaleby: string name of the column in **df** with scalar values
+        :type scaleby: str
+        :param progress: *Optional* - Function called in the event loop with the record of every iteration, 
+            as described in :class:`IterationLog`; default is ``None``
+        :type progress: callable
+        :param time_budget: *Optional* - Seconds to separate for, after which shapes are put back where they 
+            overlapped least. See :meth:`separate_map`; default is ``None``, for no limit
+        :type time_budget: float
+        :param executor: *Optional* - Thread pool to run in. Progress and cancellation are passed between the 
+            run and the event loop in memory, so the run can't be in another process; default is ``None``, the 
+            event loop's default thread pool
+        :type executor: concurrent.futures.ThreadPoolExecutor
+        :param kwargs: *Optional* - Any other arguments of :meth:`scale_map`. A **callback** is called in the executor
+        :raises TypeError: if **executor** isn't a ``ThreadPoolExecutor``
+        :returns: Dataframe with updated geometry column 
+        :rtype: GeoPandas ``DataFrame``
+        '''
+        if executor is not None and not isinstance(executor, ThreadPoolExecutor):
+            raise TypeError('scale_map_async runs in a ThreadPoolExecutor, not {}'.format(type(executor).__name__) )
+        options = self._scale_map_options(dict(kwargs, time_budget=time_budget))
+        loop = asyncio.get_running_loop()
+        key = None
+        if options['callback'] is None and options.get('initial_displacements') is None:
+            #Hashing the whole map takes as long as the map is large, so keep it off the event loop
+            digest = await loop.run_in_executor(None, self._map_key, df, options['geo'])
+            key = (loop, type(self), digest, scaleby, repr(sorted(options.items())))
+        run = BaseScaler._async_runs.get(key) if key is not None else None
+        if run is None:
+            run = _AsyncRun(loop)
+            scaler = type(self)()
+            run.future = loop.run_in_executor(executor, run.scale, scaler, df, scaleby, options)
+            if key is not None:
+                BaseScaler._async_runs[key] = run
+                run.future.add_done_callback(lambda _: self._forget_async_run(key, run))
+        run.waiters += 1
+        if progress is not None:
+            run.listeners.append(progress)
+        try:
+            result, scaler = await asyncio.shield(run.future)
+        except asyncio.CancelledError:
+            run.waiters -= 1
+            if not run.waiters:
+                run.stop.set()
+                #A stopped run can't be shared; identical requests from now on start their own
+                self._forget_async_run(key, run)
+            raise
+        finally:
+            if progress is not None:
+                run.listeners.remove(progress)
+        self.convergence_report = dict(scaler.convergence_report)
+        self.displacements = scaler.displacements.copy()
+        self.overlapping_groups = scaler.overlapping_groups
+        self.group_labels = scaler.group_labels
+        self.index_by_row = scaler.index_by_row
+        self.group_centroids = scaler.group_centroids
+        return result.copy()
+    
+    def _forget_async_run(self, key, run):
+        #Stop sharing run, unless a newer run has already taken its place
+        if key is not None and BaseScaler._async_runs.get(key) is run:
+            del BaseScaler._async_runs[key]
+    
+    def _map_key(self, df, geo):
+        #Digest of the whole dataframe, to tell whether two requests are for the same map
+        digest = hashlib.sha256()
+        digest.update(pd.util.hash_pandas_object(df.drop(columns=geo)).to_numpy().tobytes())
+        for wkb in shapely.to_wkb(np.asarray(df[geo].values)):
+            digest.update(wkb)
+        return digest.hexdigest()
+    
+    def _separate_scaled(self, scaled_df, geo, **kwargs):
+        #Separate a map already scaled by scale_shapes, taking the other arguments of scale_map
+        return self.separate_map(scaled_df, geo, **kwargs)
       
     def get_group_centroid(self, obj_list):
         '''
@@ -67,80 +280,41 @@ class BaseScaler():
         :type geo: str
         :param buffer: Euclidean distance required between shapes before they are considered non-overlapping
         :type buffer: float
-        :returns: key, value pairs where key is is the group id and value is a list of shape ids.
+        :returns: key, value pairs where key is the group id and value is an array of the positions of 
+            its shapes in **df**
         :rtype: ``dict``
         '''
-        #create indices to speed up
-        tree = STRtree(df[geo])
-        
-        overlapping_groups={}
-        groups_created = 0
-        for shape in df[geo]:
-            in_existing=False
-            #Quickly find objects which have overlapping extents
-            overlaps = tree.query(shape.buffer(buffer))
-            #Reduce that subset to objects which truly overlap
-            overlaps = [x for x in overlaps if shape.buffer(buffer).intersects(x)]
-            overlaps_ids = set([id(x) for x in overlaps])
-            #Check all created groups for ANY overlap
-            #while overlapping_groups to check still exist:
-            current_group = groups_created
-            while current_group>0:
-            #If any overlapping shapes are already in the group:
-                if len(overlaps_ids.intersection(overlapping_groups[current_group])):
-                    for shape in overlaps:
-                        #add them all to that group
-                        overlapping_groups[current_group].add(id(shape))
-                    in_existing=True
-                    break
-                else:
-                    #move on to check the next group
-                    current_group = current_group-1
-
-            if not in_existing:
-                if len(overlaps)==1:
-                    #The shape doesn't overlap any others
-                    pass
-                elif len(overlaps)>1:
-                    #Create a new group with this shape, and all its overlaps
-                    overlapping_groups[groups_created+1] = set([id(poly) for poly in overlaps])
-                    groups_created += 1
-
-        #previously unintersecting sets can become intersecting with later additions
-        #The next steps do a final confirmation of the exclusivity of all sets, merging any with common member shapes
-        groupkeys = set(overlapping_groups.keys())
-        for key in groupkeys:
-            #check all except itself
-            groups_to_check = groupkeys.copy()
-            groups_to_check.remove(key)
-            confirmed=False
-            while not confirmed:
-                for key2 in groups_to_check:
-                    if (overlapping_groups[key] & overlapping_groups[key2]):
-                        #If there's an overlap, set one group to a union and the other to empty
-                        #no deletion while iterating over the keys of overlapping_groups
-                        overlapping_groups[key] = overlapping_groups[key].union(overlapping_groups[key2])
-                        overlapping_groups[key2] = set()
-                        break
-                #whether overlap was found or not, set is confirmed unique after checking all other groups
-                confirmed=True
-        #remove any  empty sets
-        overlapping_groups = {k: v for k, v in overlapping_groups.items() if v}
-        return overlapping_groups
+        layout = self._make_layout(np.asarray(df[geo].values))
+        return self._find_group_rows(layout, buffer)
+    
+    def _make_layout(self, geoms, tolerance=0):
+        return PolygonLayout(geoms, tolerance)
+    
+    def _find_group_rows(self, layout, buffer):
+        #Find every pair of overlapping shapes in one bulk query
+        left, right = layout.overlap_pairs(buffer)
+        #Overlapping groups are the connected components of the overlap graph
+        labels = connected_components(len(layout), left, right)
+        sizes = np.bincount(labels, minlength=len(layout))
+        rows = np.flatnonzero(sizes[labels] > 1)
+        rows = rows[np.argsort(labels[rows], kind='stable')]
+        #Number groups by the order of their first member in the dataframe
+        _, starts = np.unique(labels[rows], return_index=True)
+        groups = np.split(rows, starts[1:]) if len(rows) else []
+        if layout.fixed.any():
+            #Groups of fixed shapes alone can't be separated
+            groups = [group for group in groups if not layout.fixed[group].all()]
+        return dict(enumerate(groups, 1))
     
     def index_overlapping_groups(self):
         '''
-        Return a mapping of Shape IDs to their current overlapping groups;
+        Return the current overlapping group of every shape, by position;
         Inverse of :meth:`get_overlapping_groups`.
         
-        :returns: key, value pairs where key is a shape id, and value is a group id
-        :rtype: ``dict``
+        :returns: group id of every shape indexed by :meth:`index_geo_col`, ``0`` if it doesn't overlap any others
+        :rtype: ``numpy.ndarray``
         '''
-        overlapping_groups_index = {}
-        for groupnum, members in self.overlapping_groups.items():
-            for member_id in members:
-                overlapping_groups_index[member_id] = groupnum
-        return overlapping_groups_index
+        return self._group_labels(len(self.index_by_row), self.overlapping_groups)
     
     
     def update_group_centroids(self, df, geo):
@@ -154,52 +328,44 @@ class BaseScaler():
         :returns: key, value pairs where key is the group id, and value is the group centroid
         :rtype: ``dict``
         '''    
-        group_centroids = {}
-        for groupnum, members in self.overlapping_groups.items():
-            #for each group:
-            shape_list = []
-            for member_id in members:
-                #append each group member to the shape list
-                shape_list.append(df[geo][self.index_by_id[member_id]])
-            #find centroid of the group
-            group_centroids[groupnum] = self.get_group_centroid(shape_list)
-        group_centroids['all'] = self.get_group_centroid(df[geo])
+        layout = self._make_layout(np.asarray(df[geo].values))
+        return self._get_group_centroids(layout, self._group_labels(layout, self.overlapping_groups))
+    
+    def _get_group_centroids(self, layout, groups):
+        #Centroids of every group from one area-weighted reduction over group numbers
+        table = layout.group_centroids(groups)
+        groupnums = np.flatnonzero(np.bincount(groups, minlength=1))
+        groupnums = groupnums[groupnums > 0]
+        group_centroids = dict(zip(groupnums.tolist(), table[groupnums].tolist()))
+        group_centroids['all'] = layout.map_centroid().tolist()
         return group_centroids       
 
     def index_geo_col(self, df, geo):
         '''
-        Returns a mapping of Shape IDs to their initial index in the dataframe. 
+        Returns the index in the dataframe of every shape, by position. Shapes are referred to by
+        their position in **df** everywhere else, so this survives copies of the dataframe.
         
         :param df: GeoPandas Dataframe 
         :type df: GeoPandas DataFrame
         :param geo: string name of the geometry column in **df**
         :type geo: str
-        :returns: key, value pairs where key is is a shape id, and value is its row index in **df**
-        :rtype: ``dict``
+        :returns: row index in **df** of every shape
+        :rtype: ``numpy.ndarray``
         '''
-        index_by_id = dict((id(poly), i) for i, poly in zip(df.index, df[geo]))
-        return index_by_id
+        return df.index.to_numpy()
     
     def move_shape(self, shape, movement):
         '''
-        Move a Shapely Polygon by a given movement vector.
+        Move a Shapely Polygon or MultiPolygon by a given movement vector, keeping any interior rings.
         
         :param shape: Shape to be moved 
-        :type shape: Shapely Polygon    
+        :type shape: Shapely Polygon or MultiPolygon
         :param movement: vector [x,y] describing the movement
         :type movement: list or tuple
         :returns: Shape with updated coordinates 
-        :rtype: Shapely ``Polygon``
-        '''
-        new_longs = []
-        new_lats = []
-        for long, lat in shape.exterior.coords:
-            new_long = long + movement[0]
-            new_lat = lat + movement[1]
-            new_longs.append(new_long)
-            new_lats.append(new_lat)
-        new_shape = Polygon(zip(new_longs, new_lats))
-        return new_shape
+        :rtype: Shapely ``Polygon`` or ``MultiPolygon``
+        '''
+        return translate(shape, xoff=movement[0], yoff=movement[1])
 
     def nudge_shapes(self, 
                      df,
@@ -221,33 +387,30 @@ class BaseScaler():
         :returns: Dataframe with updated geometry column 
         :rtype: GeoPandas ``DataFrame``
         '''
-        new_shapes = []
-        for shape in df[geo]:
-            if id(shape) in list(self.overlapping_groups_index.keys()):
-                #If the shape overlaps any others:
-                group = self.overlapping_groups_index[id(shape)]
-                centroid = [coord[0] for coord in list(shape.centroid.coords.xy)]
-                groupcentroid = self.group_centroids[group]
-                #calculate the direction vectors from the map and group centroids
-                mapnudge = [shape_coord - map_coord for shape_coord, map_coord in zip(centroid, self.group_centroids['all'])]
-                groupnudge = [shape_coord - group_coord for shape_coord, group_coord in zip(centroid, groupcentroid)]
-                #Create a movement vector by scaling the two direction vectors by velocity and summing
-                movement = [(map_vec*map_vel + group_vec*group_vel) for map_vec,group_vec in zip(mapnudge, groupnudge)]
-                #Move the shape by the movement vector
-                if isinstance(shape,Polygon):
-                    shape = self.move_shape(shape,movement)
-                elif isinstance(shape,MultiPolygon):
-                    poly_list = []
-                    for part in shape.geoms:
-                        poly = self.move_shape(part, movement)
-                        poly_list.append(poly)
-                    shape = MultiPolygon(poly_list)
-                else:
-                    raise ValueError('Geometry values must be Shapely objects, not {}'.format( type(shape) ) )
-            new_shapes.append(shape)
+        layout = self._make_layout(np.asarray(df[geo].values))
+        layout.translate(self._get_movements(layout, self.group_labels, map_vel, group_vel))
         dfnew = df.copy()
-        dfnew[geo] = new_shapes
+        dfnew[geo] = layout.geometries()
         return dfnew
+    
+    def _get_movements(self, layout, groups, map_vel, group_vel):
+        #Movement vector [x,y] of every shape, zero if the shape doesn't overlap any others
+        movement = np.zeros((len(layout), 2))
+        moving = np.flatnonzero(groups)
+        if len(moving):
+            #Lookup table of group centroids by group number
+            group_table = np.zeros((groups.max()+1, 2))
+            for groupnum in np.unique(groups[moving]):
+                group_table[groupnum] = self.group_centroids[groupnum]
+            centroids = layout.centroids()[moving]
+            #calculate the direction vectors from the map and group centroids
+            mapnudge = centroids - np.asarray(self.group_centroids['all'])
+            groupnudge = centroids - group_table[groups[moving]]
+            #Create a movement vector by scaling the two direction vectors by velocity and summing
+            if np.ndim(group_vel):
+                group_vel = group_vel[moving, np.newaxis]
+            movement[moving] = mapnudge*map_vel + groupnudge*group_vel
+        return movement
 
 
     def separate_map(self, 
@@ -257,7 +420,17 @@ class BaseScaler():
                      group_vel,
                      buffer,
                      max_iter,
-                     verbose):
+                     verbose,
+                     n_jobs=1,
+                     sync_iter=5,
+                     callback=None,
+                     adaptive=False,
+                     tol=0,
+                     method='centroid',
+                     simplify=0,
+                     initial_displacements=None,
+                     fixed=None,
+                     time_budget=None):
         '''
         Reposition shapes on a map so that none of them overlap.
         
@@ -278,51 +451,382 @@ class BaseScaler():
         :type max_iter: int
         :param verbose: Whether to print progress as shapes are separated
         :type verbose: boolean
-        :returns: Dataframe with updated geometry column 
+        :param n_jobs: *Optional* - Number of processes to separate the map in. The map is split into 
+            one strip per process, keeping each overlapping group whole; default is ``1``, which separates 
+            the whole map in this process
+        :type n_jobs: int
+        :param sync_iter: *Optional* - With **n_jobs** above 1, number of iterations each process runs on its
+            strip before the map centroid and groups are synchronized across the whole map; default is ``5``
+        :type sync_iter: int
+        :param callback: *Optional* - Function called with a ``dict`` describing each iteration: phase timings, 
+            group counts, shapes moved and the remaining overlap area. See :class:`IterationLog`. Measuring the 
+            overlap area costs extra, so it is only done when a callback is given. The callback may raise 
+            ``StopIteration`` to stop separating early, keeping shapes where they are; default is ``None``
+        :type callback: callable
+        :param adaptive: *Optional* - Whether to adapt the velocity of each group to how deeply its shapes overlap, 
+            so that one nudge roughly clears the deepest overlap in the group. Velocities start from 
+            **group_vel** and may double each iteration, up to ``1``, while the group's overlap area shrinks; 
+            they are halved when it doesn't. Runs in one process, so it can't be combined with **n_jobs**; 
+            default is ``False``
+        :type adaptive: boolean
+        :param tol: *Optional* - Stop once the area where shapes still overlap is at most this fraction of the 
+            total area of the shapes; default is ``0``, which stops only when no shapes overlap
+        :type tol: float
+        :param method: *Optional* - How shapes are moved apart. ``'centroid'`` nudges them away from the centroids
+            of their group and the map by **group_vel** and **map_vel**. ``'mtv'`` instead moves every overlapping 
+            pair apart by its minimum translation vector, the shortest move that leaves the two shapes **buffer** 
+            apart, averaging the moves of shapes that overlap several others, and spreads each group from its 
+            centroid just enough to make room for its overlap area. This usually separates the map in far fewer 
+            iterations and moves shapes less. **map_vel**, **group_vel** and **adaptive** are ignored with 
+            ``'mtv'``, which runs in one process; default is ``'centroid'``
+        :type method: str
+        :param simplify: *Optional* - Tolerance to simplify shapes by while they are separated. Each shape is 
+            separated as a simplified outline drawn around it, reaching at most about twice the tolerance beyond it, and 
+            the moves found for the outlines are applied to the full-detail shapes, which end up at least **buffer** apart. 
+            ``True`` picks a quarter of **buffer**, or 1% of the median shape's size when **buffer** is ``0``. Bubbles
+            are separated as exact circles, so this only applies to shapes; default is ``0``, which separates the 
+            full-detail shapes
+        :type simplify: float or boolean
+        :param initial_displacements: *Optional* - (n, 2) array of the [x,y] distance to move every shape by before 
+            separating, such as the ``displacements`` kept from separating a previous frame of an animated map. 
+            Starting from where shapes ended up last time usually takes only a few iterations, and keeps shapes 
+            from jumping around between frames; default is ``None``, which starts from the shapes as they are
+        :type initial_displacements: numpy.ndarray
+        :param fixed: *Optional* - Boolean array of the shapes that must stay where they are, after any 
+            **initial_displacements**. Shapes overlapping them move away on their own; default is ``None``
+        :type fixed: numpy.ndarray
+        :param time_budget: *Optional* - Seconds to separate for. The overlap area left is measured every iteration, 
+            and once time is up, shapes are put back where they overlapped least. :meth:`get_group_members` then
+            tells which groups are still overlapping; default is ``None``, for no limit
+        :type time_budget: float
+        :raises ValueError: if **method** is unknown, if **adaptive**, ``'mtv'`` or **fixed** are combined with 
+            **n_jobs** above 1, or if **initial_displacements** or **fixed** don't have a row for every shape
+        :returns: Dataframe with updated geometry column. The [x,y] distance every shape was moved, including any
+            **initial_displacements**, is kept in ``displacements``. A summary of how the separation ended is kept in
+            ``convergence_report``: whether it ``converged``, the number of ``iterations``, the ``groups`` and
+            ``overlap_area`` left, that area as an ``overlap_fraction`` of the shapes' total area, and the mean
+            and max distance shapes were moved (``mean_displacement``, ``max_displacement``)
         :rtype: GeoPandas ``DataFrame``
         '''
-        newdf = df.copy()
-        for i in range(max_iter):
-            if verbose:
-                print('Iteration {}'.format(i+1) )
-            #index the new dataframe
-            self.index_by_id = self.index_geo_col(newdf, geo)
-            #Identify and index overlapping groups
-            self.overlapping_groups = self.get_overlapping_groups(newdf, geo, buffer)
-            self.overlapping_groups_index = self.index_overlapping_groups()
-            #Store centroid of each group
-            self.group_centroids = self.update_group_centroids(newdf, geo)
-            if self.overlapping_groups:
-                newdf = self.nudge_shapes(newdf,geo, map_vel, group_vel)
+        if method not in ('centroid', 'mtv'):
+            raise ValueError("method must be 'centroid' or 'mtv', not {!r}".format(method) )
+        if (adaptive or method == 'mtv') and n_jobs > 1:
+            raise ValueError('Adaptive and mtv separation run in one process; use n_jobs=1')
+        geoms = np.asarray(df[geo].values)
+        if simplify is True:
+            simplify = buffer/4 if buffer else .01*np.median(np.sqrt(shapely.area(geoms)))
+        layout = self._make_layout(geoms, simplify)
+        if initial_displacements is not None:
+            initial_displacements = np.asarray(initial_displacements, dtype=float)
+            if initial_displacements.shape != (len(layout), 2):
+                raise ValueError('initial_displacements must have an [x,y] row for each of the {} shapes, not shape {}'.format(
+                    len(layout), initial_displacements.shape) )
+            layout.translate(initial_displacements)
+        if fixed is not None:
+            if n_jobs > 1:
+                raise ValueError('Fixed shapes are only held in place in one process; use n_jobs=1')
+            fixed = np.asarray(fixed, dtype=bool)
+            if fixed.shape != (len(layout),):
+                raise ValueError('fixed must have a value for each of the {} shapes, not shape {}'.format(
+                    len(layout), fixed.shape) )
+            layout.fixed = fixed
+        total_area = layout.areas.sum()
+        #Measure the overlap area left every iteration only when something needs it
+        measure = callback is not None or bool(tol) or time_budget is not None
+        deadline = time.perf_counter() + time_budget if time_budget is not None else None
+        #Displacements of the layout with the least overlap area so far, when on a time budget
+        best_overlap = np.inf
+        best_offsets = None
+        #Per shape largest group velocity and overlap area of its group as of the last iteration, for adaptive steps
+        step_limits = np.full(len(layout), float(group_vel))
+        last_overlap = np.full(len(layout), np.inf)
+        executor = ProcessPoolExecutor(max_workers=n_jobs) if n_jobs > 1 else None
+        try:
+            i = 0
+            while i < max_iter:
                 if verbose:
-                    print('--{} overlapping groups remaining'.format( len(self.overlapping_groups) ) )
-            else:
+                    print('Iteration {}'.format(i+1) )
+                start = time.perf_counter()
+                timings = {}
+                group_rows = self._update_groups(layout, df.index, buffer, timings)
+                residual = None
+                if method == 'mtv':
+                    if measure:
+                        residual = layout.overlap_area(buffer)
+                elif adaptive and group_rows:
+                    velocities, residual = self._adaptive_velocities(layout, group_rows, buffer, map_vel, 
+                                                                     step_limits, last_overlap)
+                elif measure:
+                    residual = layout.overlap_area(buffer)
+                if deadline is not None and residual is not None and residual < best_overlap:
+                    best_overlap = residual
+                    best_offsets = layout.offsets.copy()
+                record = None
+                if callback is not None:
+                    record = {'iteration': i+1,
+                              'groups': len(group_rows),
+                              'largest_group': max([len(rows) for rows in group_rows.values()], default=0),
+                              'shapes_moved': 0,
+                              'overlap_area': residual}
+                if not group_rows or (tol and residual <= tol*total_area):
+                    if record is not None:
+                        self._call_back(callback, dict(record, **timings, nudge_time=0., time=time.perf_counter() - start))
+                    if verbose:
+                        print('Separated in {} iterations'.format(i+1) )
+                    break
+                nudge_start = time.perf_counter()
+                if method == 'mtv':
+                    movement = self._translation_movements(layout, group_rows, buffer)
+                    layout.translate(movement)
+                    i += 1
+                elif adaptive:
+                    movement = self._nudge_layout(layout, group_rows, map_vel, velocities)
+                    i += 1
+                elif executor is None or len(group_rows) < 2:
+                    movement = self._nudge_layout(layout, group_rows, map_vel, group_vel)
+                    i += 1
+                else:
+                    steps = min(sync_iter, max_iter - i)
+                    movement = self._separate_parallel(executor, n_jobs, layout, group_rows, 
+                                                       map_vel, group_vel, buffer, steps)
+                    layout.translate(movement)
+                    i += steps
+                if record is not None:
+                    end = time.perf_counter()
+                    record['shapes_moved'] = int(movement.any(axis=1).sum())
+                    if self._call_back(callback, dict(record, **timings, nudge_time=end - nudge_start, time=end - start)):
+                        if verbose:
+                            print('Stopped after {} iterations'.format(i) )
+                        break
                 if verbose:
-                    print('Separated in {} iterations'.format(i+1) )
-                break
-                
+                    print('--{} overlapping groups remaining'.format( len(self.overlapping_groups) ) )
+                if deadline is not None and time.perf_counter() >= deadline:
+                    if verbose:
+                        print('Out of time after {} iterations'.format(i) )
+                    break
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        if best_offsets is not None and best_overlap < layout.overlap_area(buffer):
+            #Go back to where shapes overlapped least
+            layout.translate(best_offsets - layout.offsets)
+        #Groups still overlapping in the final layout
+        self._update_groups(layout, df.index, buffer)
+        self.convergence_report = self._convergence_report(layout, buffer, tol, i)
+        self.displacements = layout.offsets.copy()
+        
+        newdf = df.copy()
+        newdf[geo] = layout.geometries()
         return newdf
     
-    def get_group_members(self, original_df, property_col):
+    def get_group_members(self, original_df, property_col, groupnum=None):
         '''
         Returns the members of each group, given a column from the
         original dataframe to print. Useful for debugging / inspecting groups that are too slow to separate.
+        Groups are as of the end of the last separation, so after stopping early, such as on a 
+        **time_budget**, they are the groups left unresolved.
         
         :param original_df: GeoPandas Dataframe previously passed to :meth:`scale_map` method
         :type original_df: GeoPandas DataFrame
         :param property_col: String name of column in original_df that identifies each shape; 
             Typically a name or ID
         :type property_col: str
+        :param groupnum: *Optional* - Group number to return the members of alone; default is ``None``, 
+            for every group
+        :type groupnum: int
+        :raises KeyError: if there is no group **groupnum**
         :returns: key, value pairs where key is an arbitrary group number and value is a list 
-            of **property_col** values describing the group members
-        :rtype: ``dict``
+            of **property_col** values describing the group members; only the list for **groupnum** if given
+        :rtype: ``dict`` or ``list``
         '''
+        if groupnum is not None:
+            return original_df[property_col].loc[self.index_by_row[self.overlapping_groups[groupnum]]].tolist()
         group_members = {}
-        for groupnum, members in self.overlapping_groups.items():
-            group_members[groupnum] = []
-            for member_id in members:
-                group_members[groupnum].append(original_df[property_col][self.index_by_id[member_id]])
+        for groupnum, rows in self.overlapping_groups.items():
+            group_members[groupnum] = original_df[property_col].loc[self.index_by_row[rows]].tolist()
         return group_members
+    
+    def _call_back(self, callback, record):
+        #Report an iteration; True if the callback asked to stop
+        try:
+            callback(record)
+        except StopIteration:
+            return True
+        return False
+    
+    def _update_groups(self, layout, index, buffer, timings=None):
+        start = time.perf_counter()
+        #index the current shapes
+        self.index_by_row = np.asarray(index)
+        indexed = time.perf_counter()
+        #Identify and index overlapping groups
+        group_rows = self._find_group_rows(layout, buffer)
+        self.overlapping_groups = group_rows
+        self.group_labels = self._group_labels(len(layout), group_rows)
+        grouped = time.perf_counter()
+        #Store centroid of each group
+        self.group_centroids = self._get_group_centroids(layout, self.group_labels)
+        if timings is not None:
+            timings.update(indexing_time=indexed - start,
+                           grouping_time=grouped - indexed,
+                           centroid_time=time.perf_counter() - grouped)
+        return group_rows
+    
+    def _nudge_layout(self, layout, group_rows, map_vel, group_vel):
+        movement = self._get_movements(layout, self.group_labels, map_vel, group_vel)
+        layout.translate(movement)
+        return movement
+    
+    def _adaptive_velocities(self, layout, group_rows, buffer, map_vel, step_limits, last_overlap):
+        #Group velocity of every shape, and the total overlap area. Updates step_limits and last_overlap in place.
+        groups = self.group_labels
+        left, right, areas, depths = layout.overlap_depths(buffer)
+        pair_groups = groups[left]
+        #A nudge moves two shapes apart by (map_vel + group_vel) times the distance between their centroids,
+        #so find the group velocity that clears each overlap in one nudge, with a margin as depths are estimates
+        centroids = layout.centroids()
+        spread = np.hypot(*(centroids[left] - centroids[right]).T)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            needed = np.where(spread > 0, 1.5*np.maximum(depths, 0) / spread, np.inf) - map_vel
+        group_needed = np.zeros(len(group_rows)+1)
+        np.maximum.at(group_needed, pair_groups, needed)
+        #Double the largest step of groups whose overlap area is shrinking, and halve it when it isn't.
+        #Groups that took in shapes which weren't grouped last iteration can't be compared, so they and 
+        #groups of new shapes alone keep their steps
+        group_overlap = np.bincount(pair_groups, areas, minlength=len(group_rows)+1)
+        known = np.isfinite(last_overlap)
+        previous = np.zeros(len(group_rows)+1)
+        np.maximum.at(previous, groups[known], last_overlap[known])
+        has_known = np.bincount(groups[known], minlength=len(group_rows)+1) > 0
+        has_new = np.bincount(groups[~known], minlength=len(group_rows)+1) > 0
+        factor = np.where(group_overlap < previous, 2., .5)
+        factor[has_new | ~has_known] = 1
+        grouped = groups > 0
+        step_limits[grouped] = np.minimum(step_limits[grouped]*factor[groups[grouped]], 1)
+        group_steps = np.ones(len(group_rows)+1)
+        np.minimum.at(group_steps, groups, step_limits)
+        last_overlap[:] = np.where(grouped, group_overlap[groups], np.inf)
+        velocities = np.clip(np.minimum(group_needed, group_steps), 0, 1)
+        return velocities[groups], float(areas.sum())
+    
+    def _translation_movements(self, layout, group_rows, buffer):
+        #Move both shapes of every overlapping pair half its minimum translation vector, overshooting a little
+        #so they aren't left touching, and average the moves of shapes in several pairs
+        left, right, units, distances = layout.translation_vectors(buffer)
+        areas = layout.areas
+        vectors = units * (1.05*distances + .05*np.sqrt(np.minimum(areas[left], areas[right])))[:, np.newaxis] / 2
+        movement = np.zeros((len(layout), 2))
+        np.add.at(movement, left, vectors)
+        np.subtract.at(movement, right, vectors)
+        contacts = np.bincount(left, minlength=len(layout)) + np.bincount(right, minlength=len(layout))
+        movement /= np.maximum(contacts, 1)[:, np.newaxis]
+        #Pairwise moves only spread slowly through large groups, so also spread each group from its centroid
+        #by twice the scale that would make room for its overlap area
+        groups = self.group_labels
+        left, right, overlap_areas, _ = layout.overlap_depths(buffer)
+        group_overlap = np.bincount(groups[left], overlap_areas, minlength=len(group_rows)+1)
+        group_area = np.bincount(groups, areas, minlength=len(group_rows)+1)
+        clear_area = np.maximum(group_area - group_overlap, group_area*1e-12)
+        spread = 2 * (np.sqrt(np.divide(group_area, clear_area, out=np.ones_like(group_area), where=clear_area > 0)) - 1)
+        return movement + self._get_movements(layout, groups, 0, spread[groups])
+    
+    def _group_labels(self, n, group_rows):
+        #Group number of each of n rows, 0 if the shape doesn't overlap any others
+        groups = np.zeros(n, dtype=int)
+        for groupnum, rows in group_rows.items():
+            groups[rows] = groupnum
+        return groups
+    
+    def _convergence_report(self, layout, buffer, tol, iterations):
+        #Summary of the final layout
+        total_area = layout.areas.sum()
+        residual = layout.overlap_area(buffer)
+        groups = len(self.overlapping_groups)
+        displacement = np.hypot(*layout.offsets.T)
+        return {'converged': bool(groups == 0 or residual <= tol*total_area),
+                'iterations': iterations,
+                'groups': groups,
+                'overlap_area': residual,
+                'overlap_fraction': float(residual / total_area),
+                'mean_displacement': float(displacement.mean()),
+                'max_displacement': float(displacement.max())}
+    
+    def _separate_parallel(self, executor, n_jobs, layout, group_rows, map_vel, group_vel, buffer, max_iter):
+        #Split the map into one vertical strip per process, keeping each overlapping group whole,
+        #so that each process also sees the shapes its groups may run into
+        keys = layout.centroids()[:, 0]
+        for groupnum, rows in group_rows.items():
+            keys[rows] = self.group_centroids[groupnum][0]
+        sorted_keys = np.sort(keys)
+        boundaries = sorted_keys[(np.arange(1, n_jobs) * len(keys)) // n_jobs]
+        strips = np.searchsorted(boundaries, keys, side='right')
+        #Ship each strip as WKB, along with the map centroid shared by all strips
+        geoms = layout.proxies()
+        jobs = []
+        for strip in range(n_jobs):
+            rows = np.flatnonzero(strips == strip)
+            if len(rows):
+                job = executor.submit(_separate_strip, type(self), shapely.to_wkb(geoms[rows]), 
+                                      self.group_centroids['all'], map_vel, group_vel, buffer, max_iter)
+                jobs.append((rows, job))
+        movement = np.zeros((len(layout), 2))
+        for rows, job in jobs:
+            movement[rows] = job.result()
+        return movement
+
+
+def _separate_strip(scaler_class, wkbs, map_centroid, map_vel, group_vel, buffer, max_iter):
+    #Separate one strip of the map on its own in a worker process, holding the map centroid fixed.
+    #Returns the movement [x,y] of every shape in the strip.
+    scaler = scaler_class()
+    layout = scaler._make_layout(shapely.from_wkb(wkbs))
+    for i in range(max_iter):
+        group_rows = scaler._update_groups(layout, np.arange(len(layout)), buffer)
+        if not group_rows:
+            break
+        scaler.group_centroids['all'] = map_centroid
+        scaler._nudge_layout(layout, group_rows, map_vel, group_vel)
+    return layout.offsets
+
+
+def _import_pyogrio():
+    #pyogrio is only needed to scale files a tile at a time, so it's an optional dependency
+    try:
+        import pyogrio
+    except ImportError:
+        raise ImportError('scale_file needs pyogrio; install it with pip install mapscaler[files]') from None
+    return pyogrio
+
+
+class _AsyncRun():
+    #One run of scale_map in an executor, relaying progress to the event loop and stopping when asked
+    def __init__(self, loop):
+        self.loop = loop
+        self.future = None
+        self.listeners = []
+        self.waiters = 0
+        self.stop = threading.Event()
+    
+    def scale(self, scaler, df, scaleby, options):
+        callback = options['callback']
+        def report(record):
+            if callback is not None:
+                callback(record)
+            self.loop.call_soon_threadsafe(self.notify, record)
+            if self.stop.is_set():
+                raise StopIteration
+        result = scaler.scale_map(df, scaleby, **dict(options, callback=report))
+        return result, scaler
+    
+    def notify(self, record):
+        for listener in list(self.listeners):
+            listener(record)
+
+
+def _scale_column(scaler_class, scaled_df, geo, options):
+    #Separate the map scaled by one column in a worker process
+    scaler = scaler_class()
+    return scaler._separate_scaled(scaled_df, geo, **options), scaler.convergence_report
 
     
 class ShapeScaler(BaseScaler):
@@ -335,7 +839,15 @@ class ShapeScaler(BaseScaler):
                   group_vel=.1,
                   buffer=0,
                   max_iter=100,
-                  verbose=False):
+                  verbose=False,
+                  n_jobs=1,
+                  callback=None,
+                  adaptive=False,
+                  tol=0,
+                  method='centroid',
+                  simplify=0,
+                  initial_displacements=None,
+                  time_budget=None):
         '''
         Automatically scale the parts of any map by any variable, without any 
         overlapping shapes and with minimal distortion. 
@@ -361,18 +873,174 @@ class ShapeScaler(BaseScaler):
         :param verbose: *Optional* - Whether to print progress as shapes are separated; 
             default is ``False``
         :type verbose: boolean
+        :param n_jobs: *Optional* - Number of processes to separate the map in, each taking a strip of 
+            the map with its overlapping groups whole; default is ``1``
+        :type n_jobs: int
+        :param callback: *Optional* - Function called with a ``dict`` describing each iteration of the 
+            separation, such as an :class:`IterationLog`; default is ``None``
+        :type callback: callable
+        :param adaptive: *Optional* - Whether to adapt each group's velocity to how deeply its shapes overlap,
+            which usually separates the map in fewer iterations and moves shapes less. See 
+            :meth:`separate_map`; default is ``False``
+        :type adaptive: boolean
+        :param tol: *Optional* - Stop once the area where shapes still overlap is at most this fraction of the 
+            total area of the shapes; default is ``0``
+        :type tol: float
+        :param method: *Optional* - ``'centroid'`` to nudge shapes away from group and map centroids, or ``'mtv'``
+            to move each overlapping pair apart by its minimum translation vector. See :meth:`separate_map`; 
+            default is ``'centroid'``
+        :type method: str
+        :param simplify: *Optional* - Tolerance to simplify shapes by while they are separated, or ``True`` to pick 
+            one from **buffer**. The full-detail shapes are moved in the end. See :meth:`separate_map`; default is ``0``
+        :type simplify: float or boolean
+        :param initial_displacements: *Optional* - (n, 2) array of the [x,y] distance to move every shape by before 
+            separating, such as ``displacements`` after scaling the previous frame of an animated map. See 
+            :meth:`separate_map`; default is ``None``
+        :type initial_displacements: numpy.ndarray
+        :param time_budget: *Optional* - Seconds to separate for, after which shapes are put back where they 
+            overlapped least. See :meth:`separate_map`; default is ``None``, for no limit
+        :type time_budget: float
         :returns: Dataframe with updated geometry column 
         :rtype: GeoPandas ``DataFrame``
         '''
         scaled_df = self.scale_shapes(df, scaleby, geo)
-        separated_df = self.separate_map(scaled_df, geo, map_vel, group_vel, buffer, max_iter, verbose)
+        separated_df = self.separate_map(scaled_df, geo, map_vel, group_vel, buffer, max_iter, verbose, 
+                                         n_jobs=n_jobs, callback=callback, 
+                                         adaptive=adaptive, tol=tol, method=method, 
+                                         simplify=simplify, initial_displacements=initial_displacements, 
+                                         time_budget=time_budget)
         return separated_df
     
+    def scale_file(self, path, scaleby, output, tile_size, halo=None, bounds=None, **kwargs):
+        '''
+        Scale a map too large to hold in memory from one file into another, one tile at a time.
+        
+        The map is cut into square tiles of **tile_size**, and every shape belongs to the tile its bounding 
+        box is centered in. The file is then read twice, a tile at a time:
+        
+        #. Each tile is summed up as a box around its shapes, grown by as much as their area grows once 
+           scaled, and the boxes are separated as a small map of their own. This spreads the tiles apart 
+           about as far as separating the whole map would.
+        #. Each tile is read again with the shapes within **halo** of it, moved along with their tile's box, 
+           then scaled and separated as :meth:`scale_map` would, and its own shapes are appended to **output**. 
+           Shapes already written for earlier tiles are held where they ended up, so later tiles are separated 
+           around them.
+        
+        Only a tile and its halo are held at a time, along with the displacement of every shape seen so far, 
+        so memory is bounded by the size of the tiles rather than the size of the map.
+        
+        .. warning:: Shapes near the border of a tile can be left overlapping where the tile can't make room
+            around the shapes already written for its neighbors, or where shapes move further than **halo**.
+            Larger tiles, a larger **halo** and ``method='mtv'``, which moves shapes less, all help; the
+            ``convergence_reports`` show which tiles were left with overlaps.
+        
+        :param path: Path of any file geopandas can read by bounding box, such as a GeoPackage or Shapefile
+        :type path: str
+        :param scaleby: string name of the column in the file with scalar values
+        :type scaleby: str
+        :param output: Path of the file to write the scaled map to, in the format given by its extension. Rows 
+            are written a tile at a time, with their feature id in **path** in a ``source_fid`` column
+        :type output: str
+        :param tile_size: Width and height of each tile, in the units of the map
+        :type tile_size: float
+        :param halo: *Optional* - Distance around each tile to read neighboring shapes from, which should be more 
+            than shapes move within their tile; default is ``None``, a quarter of **tile_size**
+        :type halo: float
+        :param bounds: *Optional* - [minx, miny, maxx, maxy] extent of the map to tile; default is ``None``, 
+            the extent of the file
+        :type bounds: list
+        :param kwargs: *Optional* - Any other arguments of :meth:`scale_map`, used for every tile, except
+            **n_jobs** and **initial_displacements**
+        :raises ValueError: if **n_jobs** is above 1
+        :raises ImportError: if pyogrio, which reads and writes the file a tile at a time, isn't installed
+        :returns: number of shapes written to **output**. The ``convergence_report`` of each tile is kept 
+            in ``convergence_reports`` by its (column, row) in the grid
+        :rtype: ``int``
+        '''
+        pyogrio = _import_pyogrio()
+        options = self._scale_map_options(kwargs, exclude=['geo', 'initial_displacements'])
+        if options['n_jobs'] > 1:
+            raise ValueError('Tiles are separated one after the other, each in one process; use n_jobs=1')
+        if halo is None:
+            halo = tile_size/4
+        if bounds is None:
+            bounds = pyogrio.read_info(path, force_total_bounds=True)['total_bounds']
+        minx, miny, maxx, maxy = bounds
+        grid = (max(int(np.ceil((maxx - minx)/tile_size)), 1), max(int(np.ceil((maxy - miny)/tile_size)), 1))
+        #Box around the shapes of every tile, grown by as much as their area grows once scaled
+        tiles = []
+        boxes = []
+        for tile_key, tile, owned, _ in self._read_tiles(path, bounds, tile_size, grid, 0):
+            shapes = np.asarray(tile.geometry.values)[owned]
+            areas = shapely.area(shapes)
+            growth = np.sqrt((areas * self._get_scalars(tile[owned], scaleby)**2).sum() / areas.sum())
+            shape_bounds = shapely.bounds(shapes)
+            box_minx, box_miny = shape_bounds[:, :2].min(axis=0)
+            box_maxx, box_maxy = shape_bounds[:, 2:].max(axis=0)
+            center_x, center_y = (box_minx + box_maxx)/2, (box_miny + box_maxy)/2
+            half_width, half_height = growth*(box_maxx - box_minx)/2, growth*(box_maxy - box_miny)/2
+            tiles.append(tile_key)
+            boxes.append(shapely.box(center_x - half_width, center_y - half_height, 
+                                     center_x + half_width, center_y + half_height))
+        #Spread the tiles apart by separating their boxes
+        self.separate_map(gpd.GeoDataFrame(geometry=boxes), 'geometry', options['map_vel'], options['group_vel'], 
+                          options['buffer'], options['max_iter'], False, method=options['method'])
+        tile_displacements = dict(zip(tiles, map(tuple, self.displacements)))
+        #Displacement of every shape seen so far by feature id, and the ids already written
+        displacements = {}
+        written = set()
+        self.convergence_reports = {}
+        for tile_key, tile, owned, owners in self._read_tiles(path, bounds, tile_size, grid, halo):
+            fids = tile.index.tolist()
+            start = np.array([displacements.get(fid, tile_displacements.get(owner, (0., 0.))) 
+                              for fid, owner in zip(fids, owners)])
+            done = np.array([fid in written for fid in fids])
+            geo = tile.geometry.name
+            separated = self.separate_map(self.scale_shapes(tile, scaleby, geo), geo, 
+                                          initial_displacements=start, fixed=done, **options)
+            displacements.update(zip(fids, map(tuple, self.displacements)))
+            pyogrio.write_dataframe(separated[owned].rename_axis('source_fid').reset_index(), output, 
+                                    append=bool(written))
+            written.update(tile.index[owned])
+            self.convergence_reports[tile_key] = self.convergence_report
+        return len(written)
+    
+    def _read_tiles(self, path, bounds, tile_size, grid, halo):
+        #Read every tile of the grid that has shapes of its own, with the shapes within halo of it, 
+        #which of them belong to the tile and the (column, row) of the tile every shape belongs to
+        pyogrio = _import_pyogrio()
+        minx, miny = bounds[:2]
+        columns, rows = grid
+        for row in range(rows):
+            for column in range(columns):
+                x, y = minx + column*tile_size, miny + row*tile_size
+                tile = pyogrio.read_dataframe(path, bbox=(x - halo, y - halo, x + tile_size + halo, y + tile_size + halo), 
+                                              fid_as_index=True)
+                if tile.empty:
+                    continue
+                shape_bounds = shapely.bounds(np.asarray(tile.geometry.values))
+                owner_columns = np.clip(((shape_bounds[:, 0] + shape_bounds[:, 2])/2 - minx)//tile_size, 0, columns - 1)
+                owner_rows = np.clip(((shape_bounds[:, 1] + shape_bounds[:, 3])/2 - miny)//tile_size, 0, rows - 1)
+                owned = (owner_columns == column) & (owner_rows == row)
+                if owned.any():
+                    yield ((column, row), tile, owned, 
+                           list(zip(owner_columns.astype(int).tolist(), owner_rows.astype(int).tolist())))
+    
     
     
 class BubbleScaler(BaseScaler):
     
-    def convert_to_bubbles(self, df, geo):
+    def _make_layout(self, geoms, tolerance=0):
+        #Bubbles are separated as circles (x, y, r) and only rebuilt as polygons at the end
+        return CircleLayout(geoms)
+    
+    def _separate_scaled(self, scaled_df, geo, usa_albers=False, resolution=70, **kwargs):
+        if usa_albers:
+            scaled_df = alberize48_gdf(scaled_df, geo)
+        bubbled_df = self.convert_to_bubbles(scaled_df, geo, resolution)
+        return self.separate_map(bubbled_df, geo, **kwargs)
+    
+    def convert_to_bubbles(self, df, geo, resolution=70):
         '''
         Convert all shapes in a geopandas dataframe to circles, retaining areas and centroid coordinates.
         
@@ -380,17 +1048,23 @@ class BubbleScaler(BaseScaler):
         :type df: GeoPandas DataFrame    
         :param geo: String name of the geometry column in **df**
         :type geo: str
+        :param resolution: *Optional* - Number of segments in each quarter of a circle, as in shapely's 
+            ``buffer``; default is ``70``. Bubbles are separated as exact circles, so this only sets how 
+            smooth they are drawn
+        :type resolution: int
         :returns: Dataframe with updated geometry column, each shape converted to a same-area circle  
         :rtype: GeoPandas ``DataFrame``
         '''
-        bubbles = []
-        for shape in df[geo]:
-            area = shape.area
-            long,lat = shape.centroid.coords.xy
-            bubble = Point(long[0],lat[0]).buffer(np.sqrt(area/np.pi), resolution=70)
-            bubbles.append(bubble)
+        shapes = np.asarray(df[geo].values)
+        radii = np.sqrt(shapely.area(shapes)/np.pi)
+        centers = shapely.get_coordinates(shapely.centroid(shapes))
+        #Every circle is the same closed unit circle, clockwise from [1,0] like a buffered point, scaled and offset
+        angles = -np.arange(4*resolution + 1) * (np.pi / (2*resolution))
+        angles[-1] = 0
+        template = np.column_stack([np.cos(angles), np.sin(angles)])
+        rings = centers[:, np.newaxis, :] + radii[:, np.newaxis, np.newaxis] * template
         newdf = df.copy()
-        newdf[geo] = bubbles
+        newdf[geo] = shapely.polygons(rings)
         newdf[geo] = newdf[geo].astype('geometry')
         return newdf   
     
@@ -403,7 +1077,15 @@ class BubbleScaler(BaseScaler):
                   group_vel=.1,
                   buffer=0,
                   max_iter=100,
-                  verbose=False):
+                  verbose=False,
+                  n_jobs=1,
+                  callback=None,
+                  adaptive=False,
+                  tol=0,
+                  method='centroid',
+                  initial_displacements=None,
+                  resolution=70,
+                  time_budget=None):
         '''
         Convert all shapes in a map to circles, and automatically scale the parts of any map by any variable, 
         without any overlapping shapes and with minimal distortion. 
@@ -432,12 +1114,41 @@ class BubbleScaler(BaseScaler):
         :param verbose: *Optional* - Whether to print progress as shapes are separated; 
             default is ``False``
         :type verbose: boolean
+        :param n_jobs: *Optional* - Number of processes to separate the map in, each taking a strip of 
+            the map with its overlapping groups whole; default is ``1``
+        :type n_jobs: int
+        :param callback: *Optional* - Function called with a ``dict`` describing each iteration of the 
+            separation, such as an :class:`IterationLog`; default is ``None``
+        :type callback: callable
+        :param adaptive: *Optional* - Whether to adapt each group's velocity to how deeply its shapes overlap,
+            which usually separates the map in fewer iterations and moves shapes less. See 
+            :meth:`separate_map`; default is ``False``
+        :type adaptive: boolean
+        :param tol: *Optional* - Stop once the area where shapes still overlap is at most this fraction of the 
+            total area of the shapes; default is ``0``
+        :type tol: float
+        :param method: *Optional* - ``'centroid'`` to nudge shapes away from group and map centroids, or ``'mtv'``
+            to move each overlapping pair apart by its minimum translation vector. See :meth:`separate_map`; 
+            default is ``'centroid'``
+        :type method: str
+        :param initial_displacements: *Optional* - (n, 2) array of the [x,y] distance to move every shape by before 
+            separating, such as ``displacements`` after scaling the previous frame of an animated map. See 
+            :meth:`separate_map`; default is ``None``
+        :type initial_displacements: numpy.ndarray
+        :param resolution: *Optional* - Number of segments in each quarter of a bubble. See 
+            :meth:`convert_to_bubbles`; default is ``70``
+        :type resolution: int
+        :param time_budget: *Optional* - Seconds to separate for, after which shapes are put back where they 
+            overlapped least. See :meth:`separate_map`; default is ``None``, for no limit
+        :type time_budget: float
         :returns: Dataframe with updated geometry column 
         :rtype: GeoPandas ``DataFrame``
         '''
         scaled_df = self.scale_shapes(df, scaleby, geo)
-        if usa_albers:
-            scaled_df = alberize48_gdf(scaled_df, geo)
-        bubbled_df = self.convert_to_bubbles(scaled_df, geo)
-        separated_df = self.separate_map(bubbled_df, geo, map_vel, group_vel, buffer, max_iter, verbose)
+        separated_df = self._separate_scaled(scaled_df, geo, usa_albers, resolution, map_vel=map_vel, group_vel=group_vel, 
+                                             buffer=buffer, max_iter=max_iter, verbose=verbose, 
+                                             n_jobs=n_jobs, callback=callback, 
+                                             adaptive=adaptive, tol=tol, method=method, 
+                                             initial_displacements=initial_displacements, 
+                                             time_budget=time_budget)
         return separated_df
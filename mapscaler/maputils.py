@@ -1,7 +1,5 @@
-from shapely.geometry import Point,Polygon, MultiPolygon
-import pandas as pd
 import numpy as np
-import geopandas as gpd
+import shapely
 
 
 def alberize(lat,
@@ -12,13 +10,13 @@ def alberize(lat,
              map_centroid_lat=39.8,
              map_centroid_long=-98.5):
     '''
-    Converts a (lat, long) point to its (x,y) coordinates
+    Converts (lat, long) points to their (x,y) coordinates
     in an albers equal area projection. More info on page 100:
     https://pubs.usgs.gov/pp/1395/report.pdf
     
     Inputs:
-        lat: Latitude of the point to convert
-        long: Longitude of the point to convert
+        lat: Latitude of the point to convert, or an array of latitudes
+        long: Longitude of the point to convert, or an array of longitudes
         R: Radius of the Unit Sphere
         std_prl_1: First Standard Parallel (Latitude). 
             (See Deetz & Adams 1934)
@@ -27,19 +25,18 @@ def alberize(lat,
         map_centroid_lat: Latitude Center of Map 
         map_centroid_long: Longitude Center of Map
             https://pubs.usgs.gov/unnumbered/70039437/report.pdf
+    Output: x, y coordinates, as arrays if lat and long are arrays
 
     ''' 
     #Inputs as radians
     lat_rad = np.deg2rad(lat)
-    long_rad = np.deg2rad(long)
     theta1 = np.deg2rad(std_prl_1)
     theta2 = np.deg2rad(std_prl_2)
     theta0 = np.deg2rad(map_centroid_lat)
-    lambda0 = np.deg2rad(map_centroid_long)
     
-    if abs(long - lambda0)>180:
-        raise 'Not Yet Implemented to support ranges larger than half the earth. '+\
-            'See https://pubs.usgs.gov/pp/1395/report.pdf'
+    #Longitude from the map center, wrapped across the antimeridian into [-180, 180)
+    #See https://pubs.usgs.gov/pp/1395/report.pdf
+    delta_long = (np.asarray(long) - map_centroid_long + 180) % 360 - 180
     
     #Formula Documentation: https://pubs.usgs.gov/pp/1395/report.pdf p100
     #Specific to the map
@@ -47,39 +44,82 @@ def alberize(lat,
     C = ( np.cos(theta1) )**2 + 2*n*np.sin(theta1)
     p0 = (R * ( C - 2*n*np.sin(theta0) )**.5) / n
     
-    #specific to the point
+    #specific to the points
     p = (R * (C - 2*n*np.sin(lat_rad) )**.5) / n
-    bigtheta = n * (long - np.rad2deg(lambda0))
+    bigtheta = n * delta_long
     newx = p * np.sin(np.deg2rad(bigtheta))
     newy = p0 - p * np.cos(np.deg2rad(bigtheta))
     
     return newx, newy
 
+def alberize_geometries(geoms, **kwargs):
+    '''
+    Input: Array of Shapely objects with (long, lat) coordinates, 
+        plus any keyword arguments of alberize
+    Output: Array of the same shapes, holes and parts included, with 
+        all coordinates projected together in one call to alberize
+    '''
+    def project(coords):
+        x, y = alberize(coords[:, 1], coords[:, 0], **kwargs)
+        return np.column_stack([x, y])
+    return shapely.transform(np.asarray(geoms), project)
+
 def alberize48_shape(shape):
     '''
-    Input: Shapely Polygon
-    Output: Shape coordinates as projected in the default 
+    Input: Shapely Polygon or MultiPolygon
+    Output: Shape, holes included, as projected in the default 
         albers equal area projection for the lower 48 US States
     '''
-    new_coords=[]
-    for long,lat in shape.exterior.coords:
-        x,y = alberize(lat,long)
-        new_coords.append((x,y))
-    return Polygon(new_coords)
+    return alberize_geometries([shape])[0]
 
-def alberize48_gdf(gdf, geo):
-    new_geo = []
-    for shape in gdf[geo]:
-        if isinstance(shape, Polygon):
-            new_shape = alberize48_shape(shape)
-            new_geo.append(new_shape)
-        elif isinstance(shape, MultiPolygon):
-            new_polys = []
-            for poly in shape.geoms:
-                new_poly = alberize48_shape(poly)
-                new_polys.append(new_poly)
-            new_geo.append(MultiPolygon(new_polys))
+def alberize_gdf(gdf, geo, **kwargs):
+    '''
+    Input: GeoPandas DataFrame, string name of its geometry column, 
+        plus any keyword arguments of alberize (R, parallels, map center)
+    Output: Copy of the DataFrame with every shape projected in an albers equal area projection
+    '''
     newdf = gdf.copy()
-    newdf[geo] = new_geo
+    newdf[geo] = alberize_geometries(gdf[geo].values, **kwargs)
     newdf[geo] = newdf[geo].astype('geometry')
     return newdf
+
+def alberize48_gdf(gdf, geo):
+    '''
+    Input: GeoPandas DataFrame, string name of its geometry column
+    Output: Copy of the DataFrame with every shape projected in the default 
+        albers equal area projection for the lower 48 US States
+    '''
+    return alberize_gdf(gdf, geo)
+
+def connected_components(n, left, right):
+    '''
+    Label the connected components of an undirected graph given as edge arrays.
+    
+    Inputs:
+        n: Number of nodes in the graph, numbered 0 to n-1
+        left: Array of node numbers at one end of each edge
+        right: Array of node numbers at the other end of each edge
+    Output: Array of length n where each node is labelled with the 
+        lowest node number in its component
+    '''
+    labels = np.arange(n)
+    left = np.asarray(left, dtype=labels.dtype)
+    right = np.asarray(right, dtype=labels.dtype)
+    while True:
+        #Every label is a root here, so unresolved edges join two different trees
+        l_roots = labels[left]
+        r_roots = labels[right]
+        unresolved = l_roots != r_roots
+        if not unresolved.any():
+            break
+        l_roots = l_roots[unresolved]
+        r_roots = r_roots[unresolved]
+        #Hook the higher root under the lower one
+        np.minimum.at(labels, np.maximum(l_roots, r_roots), np.minimum(l_roots, r_roots))
+        #Compress paths until every node points straight at its root
+        while True:
+            jumped = labels[labels]
+            if (jumped == labels).all():
+                break
+            labels = jumped
+    return labels
@@ -0,0 +1,42 @@
+import logging
+import pandas as pd
+
+
+class IterationLog():
+    """Collect the record :meth:`~mapscaler.ShapeScaler.separate_map` reports after each iteration.
+
+    Pass an instance as the ``callback`` of ``scale_map`` or ``separate_map``. Each record is a ``dict`` with:
+
+    * **iteration**: iteration number, starting at 1
+    * **groups**: number of overlapping groups found
+    * **largest_group**: number of shapes in the largest group
+    * **shapes_moved**: number of shapes nudged
+    * **overlap_area**: total area where shapes still overlap each other, before the nudge
+    * **indexing_time**, **grouping_time**, **centroid_time**, **nudge_time**: wall time of each phase in seconds
+    * **time**: wall time of the whole iteration in seconds
+
+    :param logger: *Optional* - Logger to forward every record to. Default is ``None``, which only keeps the records
+    :type logger: logging.Logger
+    :param level: *Optional* - Level to log records at; default is ``logging.INFO``
+    :type level: int
+    """
+    def __init__(self, logger=None, level=logging.INFO):
+        self.records = []
+        self.logger = logger
+        self.level = level
+
+    def __call__(self, record):
+        self.records.append(record)
+        if self.logger is not None:
+            self.logger.log(self.level,
+                            'Iteration %(iteration)d: %(groups)d groups (largest %(largest_group)d), '
+                            '%(shapes_moved)d shapes moved, overlap area %(overlap_area).6g, %(time).4fs',
+                            record)
+
+    def to_frame(self):
+        '''
+        Return all records as a DataFrame, one row per iteration.
+
+        :rtype: Pandas ``DataFrame``
+        '''
+        return pd.DataFrame(self.records)
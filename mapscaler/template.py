@@ -0,0 +1,137 @@
+import geopandas as gpd
+import pandas as pd
+import numpy as np
+import shapely
+import json
+import os
+import shutil
+import tempfile
+from pyproj import CRS
+
+
+class MapTemplate():
+    """Geometry of a map prepared once, to scale by any number of variables without parsing it again.
+
+    Every shape is held as packed arrays: the coordinates of all shapes, the row each coordinate
+    belongs to and the offsets of their rings and parts, along with the bounding box, area and
+    centroid of every shape. Scaling by new scalars only moves the packed coordinates. Pass a
+    template to :meth:`~mapscaler.ShapeScaler.scale_template` in place of a dataframe.
+
+    Templates can be saved to a directory of ``.npy`` files with :meth:`save` and read back
+    memory-mapped with :meth:`load`, so many worker processes share one copy of the map.
+
+    Only the geometry, index and CRS of **df** are kept. Maps mixing Polygons and MultiPolygons
+    are rebuilt as MultiPolygons.
+
+    :param df: GeoPandas Dataframe
+    :type df: GeoPandas DataFrame
+    :param geo: *Optional* - string name of the geometry column in **df**; default is ``'geometry'``
+    :type geo: str
+    """
+    def __init__(self, df, geo='geometry'):
+        shapes = np.asarray(df[geo].values)
+        self.geometry_type, self.coords, self.offsets = shapely.to_ragged_array(shapes)
+        self.coord_index = shapely.get_coordinates(shapes, return_index=True)[1]
+        self.bounds = shapely.bounds(shapes)
+        self.areas = shapely.area(shapes)
+        self.centroids = shapely.get_coordinates(shapely.centroid(shapes))
+        self.index = df.index
+        self.crs = df.crs
+        self.geo = geo
+        self._shapes = None
+
+    def __len__(self):
+        return len(self.bounds)
+
+    @property
+    def centers(self):
+        '''
+        The [x,y] center of the bounding box of every shape, which shapes are scaled about.
+        '''
+        return (self.bounds[:, :2] + self.bounds[:, 2:]) / 2
+
+    def shapes(self):
+        '''
+        Returns the array of shapes, rebuilt from the packed coordinates once per template.
+        '''
+        if self._shapes is None:
+            self._shapes = shapely.from_ragged_array(self.geometry_type, self.coords, self.offsets)
+        return self._shapes
+
+    def frame(self):
+        '''
+        Returns the map as a dataframe with only its geometry column, index and CRS.
+
+        :rtype: GeoPandas ``DataFrame``
+        '''
+        return gpd.GeoDataFrame({self.geo: self.shapes()}, geometry=self.geo, crs=self.crs, index=self.index)
+
+    def save(self, path):
+        '''
+        Save the template to the directory **path**, replacing any template already there.
+
+        :param path: Directory to save the template in
+        :type path: str
+        :raises ValueError: if **path** is a directory that doesn't hold a saved template
+        '''
+        if os.path.exists(path) and not os.path.isfile(os.path.join(path, 'meta.json')):
+            raise ValueError('{} already exists and is not a saved template; choose another path'.format(path))
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        tmp_path = tempfile.mkdtemp(dir=parent)
+        try:
+            arrays = {'coords': self.coords, 'coord_index': self.coord_index, 'bounds': self.bounds,
+                      'areas': self.areas, 'centroids': self.centroids}
+            for i, offsets in enumerate(self.offsets):
+                arrays['offsets{}'.format(i)] = offsets
+            index = self.index.to_numpy()
+            if index.dtype.kind == 'O':
+                index = index.astype(str)
+            arrays['index'] = index
+            for name, array in arrays.items():
+                np.save(os.path.join(tmp_path, name+'.npy'), array)
+            meta = {'geometry_type': int(self.geometry_type),
+                    'offsets': len(self.offsets),
+                    'index_dtype': str(self.index.dtype),
+                    'index_name': self.index.name,
+                    'crs': self.crs.to_json() if self.crs is not None else None,
+                    'geo': self.geo}
+            with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+                json.dump(meta, f)
+            shutil.rmtree(path, ignore_errors=True)
+            os.replace(tmp_path, path)
+        except OSError:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        '''
+        Load a template saved with :meth:`save`.
+
+        :param path: Directory the template was saved in
+        :type path: str
+        :param mmap_mode: *Optional* - How to memory-map the arrays, as in ``numpy.load``; default is ``'r'``,
+            which maps them read-only, so processes loading the same template share its pages.
+            ``None`` reads them into memory
+        :type mmap_mode: str
+        :rtype: :class:`MapTemplate`
+        '''
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        def load(name):
+            return np.load(os.path.join(path, name+'.npy'), mmap_mode=mmap_mode)
+
+        template = cls.__new__(cls)
+        template.geometry_type = shapely.GeometryType(meta['geometry_type'])
+        template.coords = load('coords')
+        template.offsets = tuple(load('offsets{}'.format(i)) for i in range(meta['offsets']))
+        template.coord_index = load('coord_index')
+        template.bounds = load('bounds')
+        template.areas = load('areas')
+        template.centroids = load('centroids')
+        template.index = pd.Index(np.array(load('index')), name=meta['index_name']).astype(meta['index_dtype'])
+        template.crs = CRS.from_json(meta['crs']) if meta['crs'] is not None else None
+        template.geo = meta['geo']
+        template._shapes = None
+        return template
@@ -19,19 +19,22 @@ setup(
     url = 'https://mapscaler.readthedocs.io/en/latest/index.html',
     download_url = 'https://github.com/conditg/mapscaler/archive/v0.0.4.tar.gz',
     keywords = ['DATA VISUALIZATION', 'MAP', 'CHOROPLETH', 'CARTOGRAM','MAP SCALER', 'GEOJSON'],
+    python_requires='>=3.8',
     install_requires=[
         'numpy',
-        'geopandas',
-        'shapely',
+        'geopandas>=0.14',
+        'shapely>=2.0',
     ],
+    extras_require={
+        'files': ['pyogrio'],
+    },
     classifiers=[
         'Development Status :: 3 - Alpha',
         'Intended Audience :: Developers',
         'Topic :: Software Development :: Build Tools',
         'License :: OSI Approved :: GNU General Public License (GPL)',
-        'Programming Language :: Python :: 2.6',
-        'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3 :: Only',
     ],
 )
 
@@ -0,0 +1,27 @@
+import os
+
+import numpy as np
+import pytest
+
+import mapscaler as ms
+
+
+@pytest.fixture(scope='session', autouse=True)
+def cache_dir(tmp_path_factory):
+    #Keep the maps cached by the tests out of the user's cache
+    path = str(tmp_path_factory.mktemp('cache'))
+    previous = os.environ.get('MAPSCALER_CACHE_DIR')
+    os.environ['MAPSCALER_CACHE_DIR'] = path
+    yield path
+    if previous is None:
+        del os.environ['MAPSCALER_CACHE_DIR']
+    else:
+        os.environ['MAPSCALER_CACHE_DIR'] = previous
+
+
+@pytest.fixture(scope='session')
+def counties():
+    #Texas counties, with two columns of random scalars
+    df = ms.MapLoader().fetch_counties('48')['df']
+    rng = np.random.default_rng(0)
+    return df.assign(scaleby=rng.uniform(.5, 2, len(df)), other=rng.uniform(.5, 2, len(df)))
@@ -0,0 +1,60 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+
+import mapscaler as ms
+
+
+def test_scale_map_async_matches_scale_map(counties):
+    records = []
+    ss = ms.ShapeScaler()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        result = asyncio.run(ss.scale_map_async(counties, 'scaleby', progress=records.append, executor=executor,
+                                                max_iter=20))
+    expected = ms.ShapeScaler()
+    assert result.geometry.geom_equals_exact(expected.scale_map(counties, 'scaleby', max_iter=20).geometry, 0).all()
+    assert ss.convergence_report == expected.convergence_report
+    assert [record['iteration'] for record in records] == list(range(1, len(records) + 1))
+    assert records[-1]['iteration'] >= ss.convergence_report['iterations']
+
+
+def test_scale_map_async_rejects_process_pools(counties):
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        with pytest.raises(TypeError, match='ThreadPoolExecutor'):
+            asyncio.run(ms.ShapeScaler().scale_map_async(counties, 'scaleby', executor=executor))
+
+
+def test_identical_requests_share_one_run(counties, monkeypatch):
+    runs = []
+    scale = ms.mapscaler._AsyncRun.scale
+    def counted(run, *args):
+        runs.append(run)
+        return scale(run, *args)
+    monkeypatch.setattr(ms.mapscaler._AsyncRun, 'scale', counted)
+    async def main():
+        return await asyncio.gather(*[ms.ShapeScaler().scale_map_async(counties, 'scaleby', max_iter=20)
+                                      for _ in range(3)])
+    results = asyncio.run(main())
+    assert len(runs) == 1
+    #Every caller gets a copy of its own
+    assert results[0] is not results[1]
+    assert results[0].geometry.geom_equals_exact(results[2].geometry, 0).all()
+
+
+def test_async_run_is_not_shared_once_stopped(counties):
+    async def main():
+        started = asyncio.Event()
+        first = asyncio.create_task(ms.ShapeScaler().scale_map_async(counties, 'scaleby',
+                                                                     progress=lambda record: started.set(),
+                                                                     max_iter=40))
+        await started.wait()
+        first.cancel()
+        await asyncio.sleep(0)
+        ss = ms.ShapeScaler()
+        await ss.scale_map_async(counties, 'scaleby', max_iter=40)
+        return ss.convergence_report
+    report = asyncio.run(main())
+    expected = ms.ShapeScaler()
+    expected.scale_map(counties, 'scaleby', max_iter=40)
+    assert report == expected.convergence_report
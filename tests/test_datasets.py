@@ -0,0 +1,86 @@
+import os
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+import shapely
+from geopandas.testing import assert_geodataframe_equal
+
+import mapscaler as ms
+from mapscaler.datasets import MapCache
+
+
+def source(filename):
+    return os.path.join(os.path.dirname(ms.__file__), 'geojson', filename)
+
+
+def assert_identical(df, expected):
+    assert_geodataframe_equal(df, expected)
+    #Shapes must come back vertex for vertex, not just cover the same area
+    shapes, expected_shapes = np.asarray(df.geometry.values), np.asarray(expected.geometry.values)
+    assert (shapely.to_wkb(shapes) == shapely.to_wkb(expected_shapes)).all()
+
+
+@pytest.mark.parametrize('filename, group_col, group', [('us_states.json', None, None),
+                                                        ('us_counties.json', 'STATE_FIPS', None),
+                                                        ('us_counties.json', 'STATE_FIPS', '48')])
+def test_cache_matches_source(tmp_path, filename, group_col, group):
+    expected = gpd.read_file(source(filename))
+    if group is not None:
+        expected = expected[expected[group_col] == group]
+    loader = ms.MapLoader(cache_dir=str(tmp_path))
+    #The first read builds the cache, the second only reads it
+    for _ in range(2):
+        assert_identical(loader.read_map(filename, group_col, group), expected)
+    assert os.listdir(str(tmp_path))
+
+
+def test_cache_can_be_turned_off(tmp_path):
+    df = ms.MapLoader(use_cache=False, cache_dir=str(tmp_path)).fetch_states()['df']
+    assert_identical(df, gpd.read_file(source('us_states.json')))
+    assert not os.listdir(str(tmp_path))
+
+
+@pytest.fixture
+def small_maps():
+    return dict((key, gpd.GeoDataFrame({'name': [key]*size}, geometry=[shapely.box(0, 0, 1, 1)]*size))
+                for key, size in [('a', 1), ('b', 2), ('c', 4)])
+
+
+def test_memory_cache_evicts_least_recently_used(small_maps):
+    cache = MapCache(max_maps=2)
+    cache.put('a', small_maps['a'])
+    cache.put('b', small_maps['b'])
+    cache.get('a')
+    cache.put('c', small_maps['c'])
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+    assert cache.info()['evictions'] == 1
+    cache.resize(1)
+    assert cache.info()['maps'] == 1 and cache.get('c') is not None
+
+
+def test_memory_cache_evicts_to_max_bytes(small_maps):
+    sizes = dict((key, MapCache().map_nbytes(gdf)) for key, gdf in small_maps.items())
+    cache = MapCache(max_maps=10, max_bytes=sizes['b'] + sizes['c'])
+    for key in 'abc':
+        cache.put(key, small_maps[key])
+    assert cache.get('a') is None
+    assert cache.info()['nbytes'] == sizes['b'] + sizes['c']
+    #Maps larger than the whole budget aren't kept at all
+    cache.put('big', pd.concat([small_maps['c']]*3))
+    assert cache.get('big') is None and cache.get('c') is not None
+
+
+def test_memory_cache_hands_out_copies(small_maps, monkeypatch):
+    cache = MapCache(max_maps=2)
+    cache.put('a', small_maps['a'])
+    cache.get('a').loc[0, 'name'] = 'changed'
+    assert cache.get('a').loc[0, 'name'] == 'a'
+
+    monkeypatch.setattr(ms.MapLoader, 'memory_cache', MapCache(max_maps=2))
+    df = ms.MapLoader().fetch_counties('48')['df']
+    df['NAME'] = 'changed'
+    assert (ms.MapLoader().fetch_counties('48')['df']['NAME'] != 'changed').all()
+    assert ms.MapLoader.memory_cache.info()['hits'] == 1
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+import shapely
+
+import mapscaler as ms
+
+
+@pytest.mark.parametrize('Scaler', [ms.ShapeScaler, ms.BubbleScaler])
+def test_fixed_shapes_stay_in_place(counties, Scaler):
+    scaler = Scaler()
+    scaled = ms.ShapeScaler().scale_shapes(counties, 'scaleby', 'geometry')
+    if Scaler is ms.BubbleScaler:
+        scaled = scaler.convert_to_bubbles(scaled, 'geometry')
+    fixed = np.zeros(len(scaled), dtype=bool)
+    fixed[::3] = True
+    result = scaler.separate_map(scaled, 'geometry', .01, .1, 0, 20, False, fixed=fixed)
+    assert result.geometry[fixed].geom_equals_exact(scaled.geometry[fixed], 0).all()
+    assert not result.geometry[~fixed].geom_equals_exact(scaled.geometry[~fixed], 0).all()
+    assert (scaler.displacements[fixed] == 0).all()
+
+
+def test_fixed_needs_a_row_for_every_shape(counties):
+    with pytest.raises(ValueError, match='fixed'):
+        ms.ShapeScaler().separate_map(counties, 'geometry', .01, .1, 0, 10, False, fixed=np.zeros(3, dtype=bool))
+
+
+def test_scale_file_writes_every_shape_once(counties, tmp_path):
+    pyogrio = pytest.importorskip('pyogrio')
+    source, output = str(tmp_path / 'counties.gpkg'), str(tmp_path / 'scaled.gpkg')
+    pyogrio.write_dataframe(counties[['NAME', 'scaleby', 'geometry']], source)
+    tile_size = 4
+    ss = ms.ShapeScaler()
+    written = ss.scale_file(source, 'scaleby', output, tile_size, max_iter=50, method='mtv')
+    result = pyogrio.read_dataframe(output)
+    assert written == len(result) == len(counties)
+    assert sorted(result['source_fid']) == sorted(pyogrio.read_dataframe(source, fid_as_index=True).index)
+    assert result.crs == counties.crs
+    #One report for every tile with shapes of its own
+    minx, miny = pyogrio.read_info(source, force_total_bounds=True)['total_bounds'][:2]
+    bounds = shapely.bounds(np.asarray(counties.geometry.values))
+    tiles = set(zip(((bounds[:, 0] + bounds[:, 2])/2 - minx)//tile_size, ((bounds[:, 1] + bounds[:, 3])/2 - miny)//tile_size))
+    assert len(tiles) > 1 and len(ss.convergence_reports) == len(tiles)
+    #Shapes are scaled as they would be in memory, then only moved
+    scaled = ss.scale_shapes(counties, 'scaleby', 'geometry')
+    expected = np.asarray(scaled.geometry.values)[np.argsort(counties['NAME'].to_numpy())]
+    shapes = np.asarray(result.sort_values('NAME').geometry.values)
+    assert np.allclose(shapely.area(shapes), shapely.area(expected))
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+import shapely
+
+from mapscaler.maputils import alberize, alberize_geometries
+
+
+def reference_alberize(lat, long, R=1, std_prl_1=29.5, std_prl_2=45.5, map_centroid_lat=39.8, map_centroid_long=-98.5):
+    #The single point formula from the USGS report, without any wrapping of the longitude
+    theta1, theta2, theta0 = np.deg2rad([std_prl_1, std_prl_2, map_centroid_lat])
+    n = (np.sin(theta1) + np.sin(theta2))/2
+    C = np.cos(theta1)**2 + 2*n*np.sin(theta1)
+    p0 = R*(C - 2*n*np.sin(theta0))**.5/n
+    p = R*(C - 2*n*np.sin(np.deg2rad(lat)))**.5/n
+    bigtheta = np.deg2rad(n*(long - map_centroid_long))
+    return p*np.sin(bigtheta), p0 - p*np.cos(bigtheta)
+
+
+@pytest.fixture
+def points():
+    rng = np.random.default_rng(0)
+    return rng.uniform(25, 49, 200), rng.uniform(-125, -67, 200)
+
+
+def test_arrays_match_points(points):
+    lat, long = points
+    x, y = alberize(lat, long)
+    expected = np.array([reference_alberize(a, b) for a, b in zip(lat, long)])
+    assert np.allclose(np.column_stack([x, y]), expected, rtol=0, atol=1e-15)
+    assert np.allclose(alberize(lat[0], long[0]), expected[0], rtol=0, atol=1e-15)
+
+
+def test_longitudes_wrap_across_the_antimeridian():
+    lat = np.array([52., 55., 60.])
+    #East of the antimeridian, such as the western Aleutians, projects as the same longitude less 360
+    assert np.allclose(alberize(lat, np.array([172., 179.5, 170.])),
+                       reference_alberize(lat, np.array([172., 179.5, 170.]) - 360), rtol=0, atol=1e-15)
+
+
+def test_geometries_keep_holes_and_parts():
+    ring = shapely.Polygon([(-100, 30), (-90, 30), (-90, 40), (-100, 40)], [[(-96, 34), (-94, 34), (-94, 36), (-96, 36)]])
+    shapes = np.array([ring, shapely.MultiPolygon([ring, shapely.box(-80, 30, -78, 32)])])
+    projected = alberize_geometries(shapes)
+    assert shapely.get_num_interior_rings(projected[0]) == 1
+    assert shapely.get_num_geometries(projected[1]) == 2
+    coords = shapely.get_coordinates(shapes)
+    assert np.allclose(shapely.get_coordinates(projected), np.column_stack(reference_alberize(coords[:, 1], coords[:, 0])))
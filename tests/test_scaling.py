@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+import shapely
+from shapely.geometry import Point
+from shapely.affinity import scale
+
+import mapscaler as ms
+
+
+def test_scale_shapes_matches_affinity_scale(counties):
+    scaled = ms.ShapeScaler().scale_shapes(counties, 'scaleby', 'geometry')
+    for shape, expected, factor in zip(scaled.geometry, counties.geometry, counties['scaleby']):
+        assert shape.equals_exact(scale(expected, factor, factor, origin='center'), 1e-12)
+
+
+@pytest.mark.parametrize('value', [np.inf, -1, 0, np.nan, None, 'many'])
+def test_invalid_scalars_name_the_column(counties, value):
+    df = counties.assign(scaleby=counties['scaleby'].astype(object))
+    df.iloc[3, df.columns.get_loc('scaleby')] = value
+    with pytest.raises(ValueError, match='in column scaleby'):
+        ms.ShapeScaler().scale_shapes(df, 'scaleby', 'geometry')
+
+
+@pytest.mark.parametrize('Scaler', [ms.ShapeScaler, ms.BubbleScaler])
+@pytest.mark.parametrize('n_jobs', [1, 2])
+def test_scale_maps_matches_scale_map(counties, Scaler, n_jobs):
+    scaler = Scaler()
+    results = scaler.scale_maps(counties, ['scaleby', 'other'], n_jobs=n_jobs, max_iter=10)
+    for column in ['scaleby', 'other']:
+        single = Scaler()
+        expected = single.scale_map(counties, column, max_iter=10)
+        assert results[column].geometry.geom_equals_exact(expected.geometry, 0).all()
+        assert scaler.convergence_reports[column] == single.convergence_report
+
+
+def test_scale_maps_checks_every_column_first(counties):
+    df = counties.assign(other=counties['other'].where(counties.index != counties.index[5], -1))
+    with pytest.raises(ValueError, match='in column other'):
+        ms.ShapeScaler().scale_maps(df, ['scaleby', 'other'], max_iter=10, callback=pytest.fail)
+
+
+@pytest.mark.parametrize('Scaler', [ms.ShapeScaler, ms.BubbleScaler])
+def test_warm_start_reproduces_previous_layout(counties, Scaler):
+    scaler = Scaler()
+    first = scaler.scale_map(counties, 'scaleby')
+    assert scaler.convergence_report['converged']
+    again = scaler.scale_map(counties, 'scaleby', initial_displacements=scaler.displacements)
+    assert scaler.convergence_report['iterations'] == 0
+    assert again.geometry.geom_equals_exact(first.geometry, 1e-9).all()
+
+
+def test_initial_displacements_must_match_shapes(counties):
+    with pytest.raises(ValueError):
+        ms.ShapeScaler().scale_map(counties, 'scaleby', initial_displacements=np.zeros((3, 2)))
+
+
+def test_bubbles_match_buffered_centroids(counties):
+    bubbles = ms.BubbleScaler().convert_to_bubbles(counties, 'geometry')
+    for bubble, shape in zip(bubbles.geometry, counties.geometry):
+        expected = Point(shape.centroid).buffer(np.sqrt(shape.area/np.pi), quad_segs=70)
+        assert np.array_equal(shapely.get_coordinates(bubble), shapely.get_coordinates(expected))
+
+
+def test_bubble_resolution_sets_vertices(counties):
+    bubbles = ms.BubbleScaler().convert_to_bubbles(counties, 'geometry', resolution=4)
+    assert (shapely.get_num_coordinates(np.asarray(bubbles.geometry.values)) == 17).all()
@@ -0,0 +1,240 @@
+import numpy as np
+import pytest
+import shapely
+
+import mapscaler as ms
+from mapscaler.layouts import PolygonLayout, CircleLayout
+
+
+def pair_set(left, right):
+    #Pairs regardless of the order they are listed in
+    return set(zip(np.minimum(left, right).tolist(), np.maximum(left, right).tolist()))
+
+
+def move_some(layout, rng, share=.2, scale=.1):
+    #Move a random share of the shapes by a random distance
+    movement = np.zeros((len(layout), 2))
+    moved = rng.random(len(layout)) < share
+    movement[moved] = rng.normal(0, scale, (moved.sum(), 2))
+    layout.translate(movement)
+
+
+def reference_groups(geoms):
+    #Connected components of every intersecting pair, found one shape at a time
+    parent = list(range(len(geoms)))
+    def find(i):
+        while parent[i] != i:
+            i = parent[i]
+        return i
+    for i in range(len(geoms)):
+        for j in np.flatnonzero(shapely.intersects(geoms[i], geoms)):
+            parent[find(i)] = find(j)
+    groups = {}
+    for i in range(len(geoms)):
+        groups.setdefault(find(i), []).append(i)
+    return sorted(group for group in groups.values() if len(group) > 1)
+
+
+def test_overlapping_groups_match_pairwise_reference(counties):
+    ss = ms.ShapeScaler()
+    scaled = ss.scale_shapes(counties, 'scaleby', 'geometry')
+    groups = ss.get_overlapping_groups(scaled, 'geometry', 0)
+    rows = [sorted(groups[groupnum].tolist()) for groupnum in sorted(groups)]
+    assert sorted(rows) == reference_groups(np.asarray(scaled.geometry.values))
+    #Groups are numbered by the order of their first member
+    assert [group[0] for group in rows] == sorted(group[0] for group in rows)
+
+
+@pytest.mark.parametrize('buffer', [0, .02])
+def test_incremental_pairs_match_full_query(counties, buffer):
+    layout = PolygonLayout(np.asarray(counties.geometry.values))
+    rng = np.random.default_rng(1)
+    layout.overlap_pairs(buffer)
+    for _ in range(5):
+        move_some(layout, rng)
+        current = layout.geometries()
+        full = shapely.STRtree(current).query(shapely.buffer(current, buffer), predicate='intersects')
+        assert pair_set(*layout.overlap_pairs(buffer)) == pair_set(*full)
+
+
+def test_overlap_area_counts_every_pair_once(counties):
+    layout = PolygonLayout(np.asarray(counties.geometry.values))
+    rng = np.random.default_rng(2)
+    layout.overlap_pairs(0)
+    for _ in range(3):
+        move_some(layout, rng)
+        current = layout.geometries()
+        pairs = pair_set(*shapely.STRtree(current).query(current, predicate='intersects'))
+        left, right = np.array(sorted(pair for pair in pairs if pair[0] != pair[1])).T
+        expected = shapely.area(shapely.intersection(current[left], current[right])).sum()
+        assert layout.overlap_area(0) == pytest.approx(expected)
+
+
+def test_circle_pairs_cover_bubble_pairs(counties):
+    bubbles = np.asarray(ms.BubbleScaler().convert_to_bubbles(counties, 'geometry').geometry.values)
+    layout = CircleLayout(bubbles)
+    #Bubbles are polygons inside their circles, so every pair of touching bubbles is a pair of touching circles
+    assert pair_set(*shapely.STRtree(bubbles).query(bubbles, predicate='intersects')) <= pair_set(*layout.overlap_pairs(0))
+
+
+def test_parallel_sync_every_iteration_matches_serial(counties):
+    scaled = ms.ShapeScaler().scale_shapes(counties, 'scaleby', 'geometry')
+    serial = ms.ShapeScaler().separate_map(scaled, 'geometry', .01, .1, 0, 10, False)
+    parallel = ms.ShapeScaler().separate_map(scaled, 'geometry', .01, .1, 0, 10, False, n_jobs=2, sync_iter=1)
+    assert parallel.geometry.geom_equals_exact(serial.geometry, 1e-9).all()
+
+
+@pytest.mark.parametrize('n_jobs', [1, 2])
+def test_group_members_by_property(counties, n_jobs):
+    ss = ms.ShapeScaler()
+    ss.scale_map(counties, 'scaleby', max_iter=3, n_jobs=n_jobs)
+    members = ss.get_group_members(counties, 'NAME')
+    assert members and members.keys() == ss.overlapping_groups.keys()
+    names = sorted(name for group in members.values() for name in group)
+    rows = np.concatenate(list(ss.overlapping_groups.values()))
+    assert names == sorted(counties['NAME'].iloc[rows])
+
+
+def test_adaptive_steps_only_grow_for_shrinking_groups(counties):
+    ss = ms.ShapeScaler()
+    #Smaller scalars leave several separate groups
+    smaller = counties.assign(scaleby=counties['scaleby']*.6)
+    layout = ss._make_layout(np.asarray(ss.scale_shapes(smaller, 'scaleby', 'geometry').geometry.values))
+    group_rows = ss._update_groups(layout, smaller.index, 0)
+    grouped = np.concatenate(list(group_rows.values()))
+    steps = np.full(len(layout), .1)
+    last_overlap = np.full(len(layout), np.inf)
+    #Groups seen for the first time keep their steps
+    ss._adaptive_velocities(layout, group_rows, 0, .01, steps, last_overlap)
+    assert (steps == .1).all()
+    #Groups whose overlap shrank double their steps, unless they took in shapes that weren't grouped before
+    last_overlap[grouped] = 1e9
+    last_overlap[group_rows[1][0]] = np.inf
+    ss._adaptive_velocities(layout, group_rows, 0, .01, steps, last_overlap)
+    assert (steps[group_rows[1]] == .1).all()
+    others = np.setdiff1d(grouped, group_rows[1])
+    assert (steps[others] == .2).all()
+    #and halve them when it grew
+    last_overlap[grouped] = 0
+    ss._adaptive_velocities(layout, group_rows, 0, .01, steps, last_overlap)
+    assert (steps[group_rows[1]] == .05).all() and (steps[others] == .1).all()
+
+
+def test_adaptive_separation_stops_at_tolerance(counties):
+    tol = .005
+    log = ms.IterationLog()
+    ss = ms.ShapeScaler()
+    ss.scale_map(counties, 'scaleby', max_iter=500, adaptive=True, tol=tol, callback=log)
+    total_area = shapely.area(np.asarray(ss.scale_shapes(counties, 'scaleby', 'geometry').geometry.values)).sum()
+    overlap = log.to_frame()['overlap_area']
+    report = ss.convergence_report
+    assert report['converged'] and report['iterations'] < 500
+    assert report['overlap_fraction'] <= tol
+    #It stops at the first iteration within the tolerance
+    assert overlap.iloc[-1] <= tol*total_area
+    assert (overlap.iloc[:-1] > tol*total_area).all()
+
+
+@pytest.mark.parametrize('buffer', [0, .02])
+@pytest.mark.parametrize('bubbles', [False, True])
+def test_translation_vectors_leave_pairs_buffer_apart(counties, buffer, bubbles):
+    scaler = ms.BubbleScaler() if bubbles else ms.ShapeScaler()
+    scaled = scaler.scale_shapes(counties, 'scaleby', 'geometry')
+    if bubbles:
+        scaled = scaler.convert_to_bubbles(scaled, 'geometry')
+    layout = scaler._make_layout(np.asarray(scaled.geometry.values))
+    left, right, units, distances = layout.translation_vectors(buffer)
+    assert len(left) and (distances > 0).all()
+    geoms = layout.geometries()
+    moved = shapely.transform(geoms[left], lambda coords: coords + np.repeat(units*distances[:, np.newaxis], 
+                              shapely.get_num_coordinates(geoms[left]), axis=0))
+    assert (shapely.distance(moved, geoms[right]) >= buffer - 1e-9).all()
+
+
+@pytest.mark.parametrize('Scaler', [ms.ShapeScaler, ms.BubbleScaler])
+def test_mtv_separates_map(counties, Scaler):
+    scaler = Scaler()
+    result = scaler.scale_map(counties, 'scaleby', max_iter=100, method='mtv')
+    report = scaler.convergence_report
+    assert report['converged'] and report['groups'] == 0 and not scaler.overlapping_groups
+    assert report['iterations'] < 100
+    geoms = np.asarray(result.geometry.values)
+    left, right = shapely.STRtree(geoms).query(geoms, predicate='intersects')
+    assert (left == right).all()
+
+
+@pytest.mark.parametrize('buffer', [0, .02])
+def test_simplified_separation_keeps_full_shapes_apart(counties, buffer):
+    ss = ms.ShapeScaler()
+    result = ss.scale_map(counties, 'scaleby', buffer=buffer, simplify=.01)
+    assert ss.convergence_report['converged']
+    geoms = np.asarray(result.geometry.values)
+    #The full-detail shapes come back, only moved
+    original = np.asarray(ss.scale_shapes(counties, 'scaleby', 'geometry').geometry.values)
+    assert (shapely.get_num_coordinates(geoms) == shapely.get_num_coordinates(original)).all()
+    tree = shapely.STRtree(geoms)
+    if buffer:
+        left, right = tree.query(geoms, predicate='dwithin', distance=buffer - 1e-9)
+    else:
+        left, right = tree.query(geoms, predicate='intersects')
+    assert (left == right).all()
+
+
+def test_proxies_contain_their_shapes(counties):
+    geoms = np.asarray(ms.ShapeScaler().scale_shapes(counties, 'scaleby', 'geometry').geometry.values)
+    for tolerance in [.005, .05]:
+        proxies = PolygonLayout(geoms, tolerance).proxies()
+        assert shapely.covers(proxies, geoms).all()
+        #and reach at most twice the tolerance beyond them
+        coords, index = shapely.get_coordinates(proxies, return_index=True)
+        assert shapely.distance(shapely.points(coords), geoms[index]).max() <= 2*tolerance + 1e-9
+
+
+def test_group_labels_invert_overlapping_groups(counties):
+    ss = ms.ShapeScaler()
+    #Rows are tracked by position, so copies and rebuilt geometries keep their groups
+    scaled = ss.scale_shapes(counties, 'scaleby', 'geometry').copy()
+    ss.index_by_row = ss.index_geo_col(scaled, 'geometry')
+    ss.overlapping_groups = ss.get_overlapping_groups(scaled, 'geometry', 0)
+    labels = ss.index_overlapping_groups()
+    assert len(labels) == len(scaled)
+    for groupnum, rows in ss.overlapping_groups.items():
+        assert (np.flatnonzero(labels == groupnum) == np.sort(rows)).all()
+    assert (labels == 0).sum() == len(scaled) - sum(len(rows) for rows in ss.overlapping_groups.values())
+
+
+def test_time_budget_keeps_the_least_overlapping_layout(counties):
+    log = ms.IterationLog()
+    ss = ms.ShapeScaler()
+    result = ss.scale_map(counties, 'scaleby', max_iter=100000, time_budget=.05, callback=log)
+    report = ss.convergence_report
+    assert not report['converged'] and report['iterations'] < 100000
+    #The layout after the last move isn't recorded, so rebuild it without a budget
+    last = ms.ShapeScaler()
+    last.scale_map(counties, 'scaleby', max_iter=report['iterations'])
+    overlaps = log.to_frame()['overlap_area'].tolist() + [last.convergence_report['overlap_area']]
+    assert report['overlap_area'] == pytest.approx(min(overlaps))
+    #Groups are those of the layout returned
+    groups = ss.get_overlapping_groups(result, 'geometry', 0)
+    assert groups.keys() == ss.overlapping_groups.keys()
+    assert all((groups[groupnum] == rows).all() for groupnum, rows in ss.overlapping_groups.items())
+    members = ss.get_group_members(counties, 'NAME')
+    assert members == dict((groupnum, counties['NAME'].iloc[rows].tolist()) for groupnum, rows in groups.items())
+    assert ss.get_group_members(counties, 'NAME', groupnum=1) == members[1]
+    with pytest.raises(KeyError):
+        ss.get_group_members(counties, 'NAME', groupnum=len(groups) + 1)
+
+
+def test_time_budget_goes_back_to_less_overlap(counties):
+    #Large moves overshoot, so overlap grows again on the second one
+    log = ms.IterationLog()
+    ss = ms.ShapeScaler()
+    result = ss.scale_map(counties, 'scaleby', group_vel=1.5, max_iter=2, time_budget=60, callback=log)
+    last = ms.ShapeScaler()
+    last.scale_map(counties, 'scaleby', group_vel=1.5, max_iter=2)
+    overlaps = log.to_frame()['overlap_area']
+    assert last.convergence_report['overlap_area'] > overlaps.min()
+    assert ss.convergence_report['overlap_area'] == pytest.approx(overlaps.min())
+    #which was the layout after the first move
+    first = ms.ShapeScaler().scale_map(counties, 'scaleby', group_vel=1.5, max_iter=1)
+    assert result.geometry.geom_equals_exact(first.geometry, 1e-9).all()
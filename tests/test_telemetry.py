@@ -0,0 +1,25 @@
+import logging
+
+import mapscaler as ms
+
+
+COLUMNS = ['iteration', 'groups', 'largest_group', 'shapes_moved', 'overlap_area',
+           'indexing_time', 'grouping_time', 'centroid_time', 'nudge_time', 'time']
+
+
+def test_iteration_log_frame(counties):
+    log = ms.IterationLog()
+    ms.ShapeScaler().scale_map(counties, 'scaleby', max_iter=5, callback=log)
+    frame = log.to_frame()
+    assert sorted(frame.columns) == sorted(COLUMNS)
+    assert frame['iteration'].tolist() == list(range(1, len(frame) + 1))
+    assert (frame['overlap_area'].iloc[:-1] > 0).all()
+    assert (frame[['indexing_time', 'grouping_time', 'centroid_time', 'nudge_time', 'time']] >= 0).all().all()
+
+
+def test_iteration_log_forwards_to_logger(counties, caplog):
+    log = ms.IterationLog(logging.getLogger('mapscaler.test'))
+    with caplog.at_level(logging.INFO, logger='mapscaler.test'):
+        ms.BubbleScaler().scale_map(counties, 'scaleby', max_iter=3, callback=log)
+    assert len(caplog.records) == len(log.records)
+    assert caplog.records[0].getMessage().startswith('Iteration 1: ')
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+import shapely
+
+import mapscaler as ms
+
+
+def coordinates(df):
+    return shapely.get_coordinates(np.asarray(df.geometry.values))
+
+
+@pytest.mark.parametrize('Scaler', [ms.ShapeScaler, ms.BubbleScaler])
+def test_scale_template_matches_scale_map(counties, tmp_path, Scaler):
+    template = ms.MapTemplate(counties)
+    template.save(str(tmp_path / 'template'))
+    loaded = ms.MapTemplate.load(str(tmp_path / 'template'))
+    expected = Scaler().scale_map(counties, 'scaleby', max_iter=10)
+    for source in [template, loaded]:
+        #Scalars by position, or by index in any order
+        for scalars in [counties['scaleby'].to_numpy(), counties['scaleby'].sample(frac=1, random_state=0)]:
+            result = Scaler().scale_template(source, scalars, max_iter=10)
+            #Maps mixing Polygons and MultiPolygons are rebuilt as MultiPolygons, with the same coordinates
+            assert np.array_equal(coordinates(result), coordinates(expected))
+            assert result.index.equals(counties.index)
+            assert result.crs == counties.crs
+
+
+def test_template_scalars_are_checked(counties):
+    scalars = counties['scaleby'].to_numpy().astype(object)
+    scalars[4] = 'many'
+    with pytest.raises(ValueError, match='for the template'):
+        ms.ShapeScaler().scale_template(ms.MapTemplate(counties), scalars)
+
+
+def test_template_resaves_after_load(counties, tmp_path):
+    first, second = str(tmp_path / 'first'), str(tmp_path / 'second')
+    ms.MapTemplate(counties).save(first)
+    ms.MapTemplate.load(first).save(second)
+    loaded = ms.MapTemplate.load(second)
+    assert loaded.crs == counties.crs
+    assert loaded.frame().geometry.geom_equals_exact(ms.MapTemplate(counties).frame().geometry, 0).all()
+    #Saving again replaces the template
+    ms.MapTemplate(counties.iloc[:10]).save(second)
+    assert len(ms.MapTemplate.load(second)) == 10
+
+
+def test_template_refuses_to_replace_other_directories(counties, tmp_path):
+    (tmp_path / 'keep.txt').write_text('data')
+    with pytest.raises(ValueError, match='not a saved template'):
+        ms.MapTemplate(counties).save(str(tmp_path))
+    assert (tmp_path / 'keep.txt').read_text() == 'data'